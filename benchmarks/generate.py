@@ -0,0 +1,158 @@
+"""Generate a deterministic synthetic UFO for benchmarks.
+
+    python -m benchmarks.generate OUTPUT.ufo [--glyphs 30000] [--pairs 200000]
+"""
+import random
+import sys
+from argparse import ArgumentParser
+
+from ufoLib2 import Font
+from ufoLib2.objects import Component
+
+# Sizes of the generated fonts, "ship" is the size of the fonts we ship
+SIZES = {
+    "small": dict(
+        glyphs=2000,
+        layers=2,
+        components=0.3,
+        points=40,
+        groups=200,
+        pairs=20000,
+        feature_lines=500,
+    ),
+    "ship": dict(
+        glyphs=30000,
+        layers=3,
+        components=0.3,
+        points=60,
+        groups=2000,
+        pairs=200000,
+        feature_lines=5000,
+    ),
+}
+
+
+def glyph_names(glyph_count):
+    return [f"glyph{i:05d}" for i in range(glyph_count)]
+
+
+def _draw(glyph, rng, point_count):
+    pen = glyph.getPen()
+    for _ in range(0, point_count, 20):
+        pen.moveTo((rng.uniform(-100, 1000), rng.uniform(-200, 800)))
+        for _ in range(4):
+            pen.lineTo((rng.uniform(-100, 1000), rng.uniform(-200, 800)))
+            pen.curveTo(
+                (rng.uniform(-100, 1000), rng.uniform(-200, 800)),
+                (rng.uniform(-100, 1000), rng.uniform(-200, 800)),
+                (rng.uniform(-100, 1000), rng.uniform(-200, 800)),
+            )
+        pen.closePath()
+
+
+def _features(rng, names, line_count):
+    classes = [f"@class{i:04d}" for i in range(max(1, line_count // 50))]
+    lines = [f"{name} = [{' '.join(rng.sample(names, 5))}];" for name in classes]
+    lines.append("feature ss01 {")
+    for _ in range(line_count // 2):
+        lines.append(f"    sub {rng.choice(names)} by {rng.choice(names)};")
+    lines.append("} ss01;")
+    lines.append("feature kern {")
+    for _ in range(line_count - line_count // 2):
+        left = rng.choice(classes + names)
+        lines.append(f"    pos {left} {rng.choice(names)} {rng.randint(-99, 99)};")
+    lines.append("} kern;")
+    return "\n".join(lines) + "\n"
+
+
+def make_font(
+    glyphs=2000,
+    layers=2,
+    components=0.3,
+    points=40,
+    groups=200,
+    pairs=20000,
+    feature_lines=500,
+    seed=0,
+):
+    # Glyphs with float coordinates, a share of them composites of earlier
+    # glyphs, extra layers with every third glyph, disjoint kerning groups,
+    # kerning between glyphs and groups and a feature file of classes,
+    # substitutions and positionings
+    rng = random.Random(seed)
+    names = glyph_names(glyphs)
+    font = Font()
+    font.info.familyName = "Synthetic"
+    font.info.unitsPerEm = 1000
+    for i, name in enumerate(names):
+        glyph = font.newGlyph(name)
+        glyph.width = rng.uniform(200, 1200)
+        glyph.unicodes = [0x10000 + i]
+        if i > 1 and rng.random() < components:
+            for base in rng.sample(names[:i], 2):
+                offset = (rng.uniform(0, 500), rng.uniform(0, 500))
+                glyph.components.append(
+                    Component(base, transformation=(1, 0, 0, 1, *offset))
+                )
+        else:
+            _draw(glyph, rng, points)
+        glyph.appendAnchor(
+            {"name": "top", "x": rng.uniform(0, 500), "y": rng.uniform(500, 900)}
+        )
+        glyph.appendAnchor(
+            {"name": "bottom", "x": rng.uniform(0, 500), "y": rng.uniform(-200, 0)}
+        )
+    for i in range(1, layers):
+        layer = font.newLayer(f"layer{i}")
+        for name in names[::3]:
+            layer.insertGlyph(font[name], name)
+    font.lib["public.glyphOrder"] = list(names)
+
+    group_size = max(1, min(10, glyphs // max(1, groups)))
+    for side in ("public.kern1.", "public.kern2."):
+        members = rng.sample(names, min(glyphs, groups * group_size))
+        for i in range(groups):
+            group = members[i * group_size : (i + 1) * group_size]
+            if group:
+                font.groups[f"{side}group{i:04d}"] = group
+    sides = (
+        names + [n for n in font.groups if n.startswith("public.kern1.")],
+        names + [n for n in font.groups if n.startswith("public.kern2.")],
+    )
+    while len(font.kerning) < pairs:
+        pair = (rng.choice(sides[0]), rng.choice(sides[1]))
+        font.kerning[pair] = rng.randint(-100, 100)
+
+    font.features.text = _features(rng, names, feature_lines)
+    return font
+
+
+def add_size_arguments(parser):
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    for key, value in SIZES["small"].items():
+        parser.add_argument("--" + key.replace("_", "-"), dest=key, type=type(value))
+
+
+def size_from_options(options):
+    # Size preset with the sizes given on the command line
+    size = dict(SIZES[options.size])
+    for key in size:
+        if getattr(options, key) is not None:
+            size[key] = getattr(options, key)
+    return size
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", metavar="OUTPUT")
+    add_size_arguments(parser)
+    options = parser.parse_args(args)
+
+    font = make_font(seed=options.seed, **size_from_options(options))
+    font.save(options.output, overwrite=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
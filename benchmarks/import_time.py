@@ -0,0 +1,82 @@
+"""Benchmark the ufotweak command line startup and report its imports.
+
+    python -m benchmarks.import_time [--runs 5] [--top 10]
+
+tests/test_imports.py checks that LAZY_MODULES aren't imported at startup.
+"""
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+# Modules only the commands using them should import
+LAZY_MODULES = (
+    "ufo2ft",
+    "fontTools.feaLib",
+    "fontTools.designspaceLib",
+    "glyphConstruction",
+    "numpy",
+)
+
+
+def import_times(module):
+    # Cumulative import time in seconds of each module imported by module,
+    # from the -X importtime output of a fresh interpreter
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def command_time(args, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "ufotweak", *args],
+            capture_output=True,
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    options = parser.parse_args(args)
+
+    times = import_times("ufotweak.__main__")
+    print(f"import ufotweak.__main__: {times['ufotweak.__main__']:.3f}s")
+    heaviest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in heaviest[1 : options.top + 1]:
+        print(f"  {seconds:.3f}s {name}")
+
+    imported = [
+        name
+        for name in times
+        if any(name == m or name.startswith(m + ".") for m in LAZY_MODULES)
+    ]
+    if imported:
+        print(f"Imported at startup: {', '.join(sorted(imported))}")
+
+    elapsed = command_time(["lib", "--help"], options.runs)
+    print(f"ufotweak lib --help: {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
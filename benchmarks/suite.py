@@ -0,0 +1,335 @@
+"""Time ufotweak operations on synthetic UFOs and compare with a baseline.
+
+    python -m benchmarks.suite run [--size ship] [--output results.json]
+    python -m benchmarks.suite run --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json results.json
+
+rename_kerning_loop and round_pens time the algorithms rename_kerning and
+round replaced, round_pens also checks that it gives the same results. The
+kerning loop isn't checked, it renames chained mappings like {a: b, b: c}
+differently.
+"""
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.pens.roundingPen import RoundingPen
+from ufoLib2 import Font
+
+from benchmarks.generate import add_size_arguments, glyph_names, make_font
+from benchmarks.generate import size_from_options
+from ufotweak.__main__ import (
+    Renamer,
+    build_parser,
+    drop_glyphs,
+    process_path,
+    touched_parts,
+)
+from ufotweak.rounding import round_glyphs
+from ufotweak.update import Updater
+
+RESULTS_VERSION = 1
+
+
+def _selected_names(size, share):
+    # Every nth glyph name, for share of the glyphs
+    names = glyph_names(size["glyphs"])
+    step = max(1, round(1 / share))
+    return names[::step]
+
+
+def bench_rename(size, seed, share, workdir):
+    font = make_font(seed=seed, **size)
+    mapping = {name: name + ".alt" for name in _selected_names(size, share)}
+    start = time.perf_counter()
+    Renamer(font, mapping).rename()
+    return time.perf_counter() - start
+
+
+def bench_drop(size, seed, share, workdir):
+    font = make_font(seed=seed, **size)
+    names = _selected_names(size, share)
+    start = time.perf_counter()
+    drop_glyphs(font, names)
+    return time.perf_counter() - start
+
+
+def bench_round(size, seed, share, workdir):
+    font = make_font(seed=seed, **size)
+    start = time.perf_counter()
+    round_glyphs(list(font))
+    return time.perf_counter() - start
+
+
+def _rename_kerning_setup(size, seed, share):
+    font = make_font(seed=seed, **size)
+    mapping = {name: name + ".alt" for name in _selected_names(size, share)}
+    renamer = Renamer(font, mapping)
+    return font, renamer, renamer._rename_groups()
+
+
+def rename_kerning_loop(kerning, mapping):
+    # Kerning renaming before Renamer._rename_kerning, looping over the mapping
+    # for each pair. A pair can be renamed twice: with {a: b, b: c}, (a, z)
+    # becomes (c, z).
+    for pair in list(kerning.keys()):
+        old_pair = pair
+        value = kerning[old_pair]
+        for old, new in mapping.items():
+            if (old, old) == pair:
+                pair = (new, new)
+                break
+            elif old == pair[0]:
+                pair = (new, pair[1])
+                if pair[1] != old_pair[1]:
+                    break
+            elif old == pair[1]:
+                pair = (pair[0], new)
+                if pair[0] != old_pair[0]:
+                    break
+        if old_pair != pair:
+            del kerning[old_pair]
+            kerning[pair] = value
+
+
+def bench_rename_kerning(size, seed, share, workdir):
+    font, renamer, group_mapping = _rename_kerning_setup(size, seed, share)
+    start = time.perf_counter()
+    renamer._rename_kerning(group_mapping)
+    return time.perf_counter() - start
+
+
+def bench_rename_kerning_loop(size, seed, share, workdir):
+    font, renamer, group_mapping = _rename_kerning_setup(size, seed, share)
+    start = time.perf_counter()
+    rename_kerning_loop(font.kerning, {**renamer.mapping, **group_mapping})
+    return time.perf_counter() - start
+
+
+def round_glyph_with_pens(glyph):
+    # Rounding before round_glyphs, through pens
+    recording_pen = RecordingPen()
+    glyph.draw(RoundingPen(recording_pen))
+    glyph.clearContours()
+    glyph.clearComponents()
+    recording_pen.replay(glyph.getPen())
+    for anchor in glyph.anchors:
+        anchor.x = round(anchor.x)
+        anchor.y = round(anchor.y)
+
+
+def _outline(glyph):
+    pen = RecordingPen()
+    glyph.draw(pen)
+    return pen.value, [(anchor.x, anchor.y) for anchor in glyph.anchors]
+
+
+def bench_round_pens(size, seed, share, workdir):
+    font = make_font(seed=seed, **size)
+    start = time.perf_counter()
+    for glyph in font:
+        round_glyph_with_pens(glyph)
+    elapsed = time.perf_counter() - start
+    expected = make_font(seed=seed, **size)
+    round_glyphs(list(expected))
+    if any(_outline(font[glyph.name]) != _outline(glyph) for glyph in expected):
+        raise AssertionError("round and round_pens differ")
+    return elapsed
+
+
+def bench_update(size, seed, share, workdir):
+    source = make_font(seed=seed, **size)
+    target = make_font(seed=seed + 1, **size)
+    names = _selected_names(size, share)
+    start = time.perf_counter()
+    Updater(source, target, names).font
+    return time.perf_counter() - start
+
+
+def bench_update_kerning(size, seed, share, workdir):
+    # Fonts with only groups and kerning, this times the group and kerning
+    # updates
+    source = make_font(seed=seed, **size)
+    source = Font(groups=source.groups, kerning=source.kerning)
+    target = make_font(seed=seed + 1, **size)
+    target = Font(groups=target.groups, kerning=target.kerning)
+    names = _selected_names(size, share)
+    start = time.perf_counter()
+    Updater(source, target, names).overlay
+    return time.perf_counter() - start
+
+
+def _bench_command(args, workdir):
+    # Command line command on a copy of the saved UFO, with --lazy
+    path = os.path.join(workdir, "copy.ufo")
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    shutil.copytree(os.path.join(workdir, "font.ufo"), path)
+    options = build_parser().parse_args([*args, "--lazy", path])
+    start = time.perf_counter()
+    process_path(path, options, touched_parts(options))
+    return time.perf_counter() - start
+
+
+def bench_lazy_drop(size, seed, share, workdir):
+    names = _selected_names(size, share)
+    return _bench_command(["glyph", "--drop", ",".join(names)], workdir)
+
+
+def bench_lazy_rename(size, seed, share, workdir):
+    mapping = ",".join(f"{n}:{n}.alt" for n in _selected_names(size, share))
+    return _bench_command(["glyph", "--rename", mapping], workdir)
+
+
+BENCHMARKS = {
+    "rename": bench_rename,
+    "rename_kerning": bench_rename_kerning,
+    "rename_kerning_loop": bench_rename_kerning_loop,
+    "drop": bench_drop,
+    "round": bench_round,
+    "round_pens": bench_round_pens,
+    "update": bench_update,
+    "update_kerning": bench_update_kerning,
+    "lazy_drop": bench_lazy_drop,
+    "lazy_rename": bench_lazy_rename,
+}
+# Benchmarks of the algorithms others replaced
+REFERENCE_BENCHMARKS = {
+    "rename_kerning": "rename_kerning_loop",
+    "round": "round_pens",
+}
+SAVED_FONT_BENCHMARKS = ("lazy_drop", "lazy_rename")
+
+
+def run(size, seed=0, share=0.01, repeat=3, names=None):
+    names = names or list(BENCHMARKS)
+    results = dict()
+    with tempfile.TemporaryDirectory() as workdir:
+        if any(name in SAVED_FONT_BENCHMARKS for name in names):
+            font = make_font(seed=seed, **size)
+            font.save(os.path.join(workdir, "font.ufo"))
+        for name in names:
+            times = [
+                BENCHMARKS[name](size, seed, share, workdir) for _ in range(repeat)
+            ]
+            results[name] = {"best": min(times), "times": times}
+            print(f"{name}: {min(times):.3f}s")
+    for name, reference in REFERENCE_BENCHMARKS.items():
+        if name in results and reference in results and results[name]["best"]:
+            speedup = results[reference]["best"] / results[name]["best"]
+            print(f"{name}: {speedup:.1f}x faster than {reference}")
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "size": size,
+        "seed": seed,
+        "share": share,
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=0.25):
+    # Best times of current against baseline, returns the regressed benchmarks
+    if (baseline["size"], baseline["seed"], baseline["share"]) != (
+        current["size"],
+        current["seed"],
+        current["share"],
+    ):
+        print("Warning: the baseline was recorded with other sizes")
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name}: {result['best']:.3f}s (no baseline)")
+            continue
+        baseline_best = baseline["results"][name]["best"]
+        ratio = result["best"] / baseline_best if baseline_best else 1.0
+        line = f"{name}: {result['best']:.3f}s, baseline {baseline_best:.3f}s"
+        line += f" ({ratio - 1:+.0%})"
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            line += " REGRESSION"
+        print(line)
+    return regressions
+
+
+def load_results(path):
+    with open(path, "r") as fp:
+        return json.load(fp)
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = subparsers.add_parser("run", description="Run the benchmarks.")
+    add_size_arguments(parser_run)
+    parser_run.add_argument(
+        "--only",
+        metavar="NAMES",
+        help=f"Comma separated benchmarks among {', '.join(BENCHMARKS)}.",
+    )
+    parser_run.add_argument("--repeat", type=int, default=3)
+    parser_run.add_argument(
+        "--share",
+        type=float,
+        default=0.01,
+        help="Share of the glyphs renamed, dropped or updated.",
+    )
+    parser_run.add_argument(
+        "--output", metavar="JSON", help="Write the results, e.g. as a baseline."
+    )
+    parser_run.add_argument(
+        "--baseline", metavar="JSON", help="Compare the results with a baseline."
+    )
+
+    parser_compare = subparsers.add_parser(
+        "compare", description="Compare results with a baseline."
+    )
+    parser_compare.add_argument("baseline", metavar="BASELINE")
+    parser_compare.add_argument("current", metavar="RESULTS")
+
+    for subparser in (parser_run, parser_compare):
+        subparser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Slowdown over the baseline reported as a regression.",
+        )
+    options = parser.parse_args(args)
+
+    if options.command == "compare":
+        baseline = load_results(options.baseline)
+        current = load_results(options.current)
+    else:
+        names = options.only.split(",") if options.only else None
+        for name in names or ():
+            if name not in BENCHMARKS:
+                parser.error(f"Unknown benchmark: {name}")
+        current = run(
+            size_from_options(options),
+            options.seed,
+            options.share,
+            options.repeat,
+            names,
+        )
+        if options.output:
+            with open(options.output, "w") as fp:
+                json.dump(current, fp, indent=2)
+        if not options.baseline:
+            return 0
+        baseline = load_results(options.baseline)
+
+    if compare(baseline, current, options.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
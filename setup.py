@@ -19,6 +19,7 @@ setup(
     entry_points={
         "console_scripts": [
             "ufotweak = ufotweak.__main__:main",
+            "ufotweak-client = ufotweak.client:main",
         ],
     },
     keywords="font, typeface, ufo",
@@ -0,0 +1,42 @@
+from ufoLib2 import Font
+
+from ufotweak.__main__ import drop_glyphs
+
+
+def make_font():
+    font = Font()
+    pen = font.newGlyph("a").getPen()
+    pen.moveTo((0, 0))
+    pen.lineTo((10, 0))
+    pen.lineTo((10, 10))
+    pen.closePath()
+    font.newGlyph("b").getPen().addComponent("a", (1, 0, 0, 1, 0, 0))
+    pen = font.newGlyph("c").getPen()
+    pen.addComponent("b", (1, 0, 0, 1, 100, 0))
+    pen.addComponent("a", (1, 0, 0, 1, 200, 0))
+    return font
+
+
+def test_drop_decomposes_components_of_dropped_glyphs():
+    # Components of the dropped glyph that are kept stay components
+    font = make_font()
+    drop_glyphs(font, ["b"])
+    assert list(font.keys()) == ["a", "c"]
+    glyph = font["c"]
+    assert not glyph.contours
+    assert [
+        (component.baseGlyph, tuple(component.transformation))
+        for component in glyph.components
+    ] == [("a", (1, 0, 0, 1, 100, 0)), ("a", (1, 0, 0, 1, 200, 0))]
+
+
+def test_drop_nested_dropped_glyphs():
+    font = make_font()
+    drop_glyphs(font, ["a", "b"])
+    assert list(font.keys()) == ["c"]
+    glyph = font["c"]
+    assert not glyph.components
+    assert [[(point.x, point.y) for point in contour] for contour in glyph] == [
+        [(100, 0), (110, 0), (110, 10)],
+        [(200, 0), (210, 0), (210, 10)],
+    ]
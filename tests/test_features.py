@@ -0,0 +1,125 @@
+from io import StringIO
+
+from fontTools.feaLib.parser import Parser
+
+from ufotweak.features import drop_glyphs_from_features, rename_glyphs_in_features
+
+GLYPH_NAMES = ["a", "b", "c", "d", "f", "i", "f_i", "a.sc", "b.sc", "c.sc", "d.sc"]
+
+
+def drop(text, glyph_names):
+    result = drop_glyphs_from_features(text, glyph_names, GLYPH_NAMES)
+    # The result is still a valid feature file
+    if "include" not in result:
+        kept = [name for name in GLYPH_NAMES if name not in glyph_names]
+        fea = result if "feature" in result else f"feature test {{\n{result}}} test;\n"
+        Parser(StringIO(fea), glyphNames=kept).parse()
+    return result
+
+
+def test_single_substitution_classes():
+    assert drop("sub [a c] by [b d];\n", ["a"]) == "sub [c] by [d];\n"
+    assert drop("sub [a c] by [b d];\n", ["d"]) == "sub [a] by [b];\n"
+    assert drop("sub [a c] by [b d];\n", ["a", "d"]) == ""
+
+
+def test_single_substitution_class_names():
+    text = "@L = [a c];\n@R = [b d];\nfeature ss01 {\n    sub @L by @R;\n} ss01;\n"
+    assert drop(text, ["a"]) == (
+        "@L = [c];\n@R = [b d];\nfeature ss01 {\n    sub [c] by [d];\n} ss01;\n"
+    )
+
+
+def test_contextual_single_substitution():
+    text = "sub f [a c]' i by [b d];\n"
+    assert drop(text, ["b"]) == "sub f [c]' i by [d];\n"
+
+
+def test_class_to_glyph_substitution():
+    assert drop("sub [a c] by b;\n", ["a"]) == "sub [c] by b;\n"
+
+
+def test_statements_removed():
+    text = "sub f i by f_i;\nsub a from [b c];\nsub b by c;\n"
+    assert drop(text, ["f_i", "b"]) == "sub a from [c];\n"
+
+
+def test_comments_kept():
+    text = (
+        "# keep me\n"
+        "feature kern {\n"
+        "    # kerning\n"
+        "    pos [a c] b -20;\n"
+        "} kern;\n"
+    )
+    assert drop(text, ["a"]) == text.replace("[a c]", "[c]")
+
+
+def test_empty_feature_removed():
+    text = (
+        "languagesystem DFLT dflt;\n"
+        "feature liga {\n"
+        "    script latn;\n"
+        "    sub f i by f_i;\n"
+        "} liga;\n"
+        "feature calt {\n"
+        "    sub a by b;\n"
+        "} calt;\n"
+    )
+    assert drop(text, ["f_i"]) == (
+        "languagesystem DFLT dflt;\nfeature calt {\n    sub a by b;\n} calt;\n"
+    )
+
+
+def test_include_kept():
+    text = (
+        "include(other.fea);\n"
+        "feature liga {\n"
+        "    sub f i by f_i;\n"
+        "    sub a by b;\n"
+        "} liga;\n"
+    )
+    assert drop(text, ["f_i"]) == text.replace("    sub f i by f_i;\n", "")
+
+
+def test_glyph_ranges():
+    text = "@sc = [a.sc - d.sc];\nsub [a-d] by @sc;\n"
+    assert drop(text, ["b"]) == (
+        "@sc = [a.sc - d.sc];\nsub [a c d] by [a.sc c.sc d.sc];\n"
+    )
+
+
+def test_mark_class():
+    text = (
+        "markClass [f i] <anchor 0 0> @TOP;\n"
+        "feature mark {\n"
+        "    pos base a <anchor 1 2> mark @TOP;\n"
+        "} mark;\n"
+        "feature calt {\n"
+        "    sub a by b;\n"
+        "} calt;\n"
+    )
+    assert drop(text, ["f", "i"]) == "feature calt {\n    sub a by b;\n} calt;\n"
+
+
+def test_nothing_to_drop():
+    text = "pos a b -20; # a comment\n"
+    assert drop_glyphs_from_features(text, ["c"], GLYPH_NAMES) is text
+
+
+def test_rename_skips_tables_other_than_gdef():
+    text = (
+        "table BASE {\n"
+        "    HorizAxis.BaseTagList ideo romn;\n"
+        "    HorizAxis.BaseScriptList latn romn -10 0;\n"
+        "} BASE;\n"
+        "table GDEF {\n"
+        "    GlyphClassDef [romn], , , ;\n"
+        "} GDEF;\n"
+        "feature liga {\n"
+        "    sub romn by latn;\n"
+        "} liga;\n"
+    )
+    assert rename_glyphs_in_features(text, {"romn": "a", "latn": "b"}) == (
+        text.replace("[romn]", "[a]").replace("sub romn by latn", "sub a by b")
+    )
@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+
+from benchmarks.import_time import LAZY_MODULES
+
+
+def test_lazy_modules_not_imported_at_startup():
+    code = (
+        "import json, sys\n"
+        "import ufotweak.__main__\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    imported = [
+        name
+        for name in json.loads(result.stdout)
+        if any(name == m or name.startswith(m + ".") for m in LAZY_MODULES)
+    ]
+    assert imported == []
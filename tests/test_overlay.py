@@ -0,0 +1,54 @@
+from ufoLib2 import Font
+from ufoLib2.objects import Glyph
+
+from ufotweak.overlay import FontOverlay, OverlayDict
+from ufotweak.parts import GLYPHS, KERNING, LIB
+
+
+def test_overlay_dict():
+    base = {"a": 1, "b": 2}
+    overlay = OverlayDict(base)
+    overlay["a"] = 1
+    overlay["c"] = 3
+    del overlay["b"]
+    assert dict(overlay) == {"a": 1, "c": 3}
+    assert base == {"a": 1, "b": 2}
+    # Setting a key to its base value isn't a change
+    assert overlay.diff() == {"b": None, "c": 3}
+    assert overlay.commit()
+    assert base == {"a": 1, "c": 3}
+    assert not overlay.commit()
+
+
+def test_font_overlay_diff():
+    font = Font()
+    font.groups["public.kern1.A"] = ["a"]
+    font.kerning[("a", "b")] = -10
+    overlay = FontOverlay(font)
+    overlay.insert_glyph("public.default", Glyph(), "b")
+    overlay.insert_glyph("public.default", Glyph(), "a")
+    overlay.kerning[("a", "b")] = 20
+    overlay.lib["public.glyphOrder"] = ["a", "b"]
+    overlay.groups["public.kern1.A"] = ["a"]
+    assert overlay.diff() == {
+        "glyphs": {"public.default": ["a", "b"]},
+        "groups": {},
+        "kerning": [["a", "b", 20]],
+        "lib": {"public.glyphOrder": ["a", "b"]},
+    }
+    assert not font.keys()
+
+
+def test_font_overlay_commit_parts():
+    font = Font()
+    font.groups["public.kern1.A"] = ["a"]
+    overlay = FontOverlay(font)
+    overlay.insert_glyph("background", Glyph(), "a")
+    overlay.kerning[("a", "b")] = 20
+    overlay.groups["public.kern1.A"] = ["a"]
+    assert overlay.commit() == {GLYPHS, KERNING}
+    assert list(font.layers["background"].keys()) == ["a"]
+    assert dict(font.kerning) == {("a", "b"): 20}
+    overlay.lib["key"] = 1
+    assert overlay.commit() == {LIB}
+    assert overlay.commit() == set()
@@ -0,0 +1,32 @@
+import pytest
+
+from ufotweak.__main__ import build_parser, parse_args, parse_designspace_args
+
+
+def test_run_paths_after_options():
+    options = parse_args(build_parser(), ["run", "r.json", "a.ufo", "--lazy", "b.ufo"])
+    assert options.recipe == "r.json"
+    assert options.lazy
+    assert options.paths == ["a.ufo", "b.ufo"]
+
+
+def test_unrecognized_arguments():
+    with pytest.raises(SystemExit):
+        parse_args(build_parser(), ["run", "r.json", "--bogus", "a.ufo"])
+    with pytest.raises(SystemExit):
+        parse_args(build_parser(), ["glyph", "a.ufo", "--lazy", "b.ufo"])
+
+
+def test_designspace_command_options():
+    parser = build_parser()
+    args = ["designspace", "--profile", "a.json", "f.designspace", "glyph"]
+    options = parse_designspace_args(parser.parse_args(args), parser)
+    assert (options.jobs, options.lazy, options.profile) == (0, False, "a.json")
+    args += ["--jobs", "1", "--lazy", "--profile", "b.json", "--cprofile", "c"]
+    options = parse_designspace_args(parser.parse_args(args), parser)
+    assert (options.jobs, options.lazy, options.profile, options.cprofile) == (
+        1,
+        True,
+        "b.json",
+        "c",
+    )
@@ -0,0 +1,93 @@
+from ufoLib2 import Font
+
+from ufotweak.__main__ import Renamer, build_parser, check_renames
+
+
+def make_font(*names):
+    font = Font()
+    for width, name in enumerate(names):
+        font.newGlyph(name).width = width
+    return font
+
+
+def test_rename_swap():
+    font = make_font("a", "b")
+    Renamer(font, {"a": "b", "b": "a"}).rename()
+    assert {glyph.name: glyph.width for glyph in font} == {"a": 1, "b": 0}
+
+
+def test_rename_to_same_name_keeps_glyphs():
+    font = make_font("a", "b")
+    Renamer(font, {"a": "x", "b": "x"}).rename()
+    assert {glyph.name: glyph.width for glyph in font} == {"x": 0, "b": 1}
+
+
+def test_rename_to_name_freed_by_skipped_rename_keeps_glyphs():
+    # b can't be renamed to c, so a can't take the name of b
+    font = make_font("a", "b", "c")
+    Renamer(font, {"a": "b", "b": "c"}).rename()
+    assert {glyph.name: glyph.width for glyph in font} == {"a": 0, "b": 1, "c": 2}
+
+
+def test_rename_chain():
+    font = make_font("a", "b")
+    Renamer(font, {"a": "b", "b": "c"}).rename()
+    assert {glyph.name: glyph.width for glyph in font} == {"b": 0, "c": 1}
+
+
+def test_rename_swap_kerning_groups():
+    font = make_font("a", "b", "c", "d")
+    font.groups["public.kern1.a"] = ["a", "c"]
+    font.groups["public.kern1.b"] = ["b", "d"]
+    font.kerning[("public.kern1.a", "d")] = -10
+    font.kerning[("public.kern1.b", "c")] = 20
+    Renamer(font, {"a": "b", "b": "a"}).rename()
+    assert dict(font.groups) == {
+        "public.kern1.b": ["b", "c"],
+        "public.kern1.a": ["a", "d"],
+    }
+    assert dict(font.kerning) == {
+        ("public.kern1.b", "d"): -10,
+        ("public.kern1.a", "c"): 20,
+    }
+
+
+def test_check_renames_after_drop(tmp_path):
+    path = str(tmp_path / "font.ufo")
+    make_font("a", "b").save(path)
+    parser = build_parser()
+    options = parser.parse_args(["glyph", "--rename", "b:a", path])
+    assert not check_renames([path], options)
+    options = parser.parse_args(["glyph", "--drop", "a", "--rename", "b:a", path])
+    assert check_renames([path], options)
+
+
+def test_rename_kerning_both_sides():
+    font = make_font("a", "b")
+    font.kerning[("a", "b")] = -10
+    Renamer(font, {"a": "x", "b": "y"})._rename_kerning({})
+    assert dict(font.kerning) == {("x", "y"): -10}
+
+
+def test_rename_kerning_swap():
+    font = make_font("a", "b")
+    font.kerning[("a", "b")] = -10
+    font.kerning[("b", "a")] = 20
+    Renamer(font, {"a": "b", "b": "a"})._rename_kerning({})
+    assert dict(font.kerning) == {("b", "a"): -10, ("a", "b"): 20}
+
+
+def test_rename_kerning_chain():
+    # Each side is renamed once, a isn't renamed on to c
+    font = make_font("a", "b", "z")
+    font.kerning[("a", "z")] = -10
+    font.kerning[("b", "z")] = 20
+    font.kerning[("public.kern1.a", "b")] = 30
+    Renamer(font, {"a": "b", "b": "c"})._rename_kerning(
+        {"public.kern1.a": "public.kern1.b"}
+    )
+    assert dict(font.kerning) == {
+        ("b", "z"): -10,
+        ("c", "z"): 20,
+        ("public.kern1.b", "c"): 30,
+    }
@@ -0,0 +1,49 @@
+from ufoLib2 import Font
+
+from ufotweak.parts import GLYPHS, GROUPS
+from ufotweak.update import Updater
+
+
+def make_font(groups, kerning):
+    font = Font()
+    for name in ("a", "b", "c", "x"):
+        font.newGlyph(name)
+    font.groups.update(groups)
+    font.kerning.update(kerning)
+    return font
+
+
+def test_update_groups():
+    source = make_font(
+        {"public.kern1.A": ["a"], "public.kern1.B": ["b"], "public.kern2.X": ["x"]},
+        {},
+    )
+    target = make_font(
+        {"public.kern1.A": ["a", "b"], "public.kern1.C": ["c"]},
+        {},
+    )
+    updater = Updater(source, target, ["b", "c"])
+    assert updater.diff()["groups"] == {
+        # b moved out of A into the new group B, C is left empty
+        "public.kern1.A": ["a"],
+        "public.kern1.B": ["b"],
+        "public.kern1.C": None,
+    }
+    font = updater.font
+    assert dict(font.groups) == {"public.kern1.A": ["a"], "public.kern1.B": ["b"]}
+    assert updater.parts == {GLYPHS, GROUPS}
+
+
+def test_update_kerning_prunes_missing_groups():
+    source = make_font(
+        {"public.kern1.B": ["b"]},
+        {("public.kern1.B", "x"): -10, ("a", "x"): 5},
+    )
+    target = make_font(
+        {"public.kern1.C": ["c"]},
+        {("public.kern1.C", "x"): 20, ("a", "x"): 30},
+    )
+    font = Updater(source, target, ["b", "c"]).font
+    assert dict(font.groups) == {"public.kern1.B": ["b"]}
+    # Kerning of a, which isn't updated, is kept
+    assert dict(font.kerning) == {("public.kern1.B", "x"): -10, ("a", "x"): 30}
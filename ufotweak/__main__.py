@@ -1,22 +1,47 @@
+import os
 import sys
 import argparse
 import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from fontTools.ufoLib import UFOFileStructure
 from fontTools.ufoLib import fontInfoAttributesVersion3ValueData as infoAttrValueData
-from fontTools import designspaceLib
-from fontTools.pens.recordingPen import RecordingPen
-from fontTools.pens.roundingPen import RoundingPen
-from ufo2ft.filters.propagateAnchors import PropagateAnchorsFilter
-from ufo2ft.filters.decomposeComponents import DecomposeComponentsFilter
-from ufoLib2 import Font
-
-from fontTools.feaLib.parser import Parser
+
+# ufo2ft, feaLib, designspaceLib, glyphConstruction and numpy are slow to
+# import, they are imported by the commands using them
+from ufotweak.glyphsdata import glyphsdata_unicodes
+from ufotweak import instrument
+from ufotweak.components import (
+    ComponentGraph,
+    decompose_components,
+    decompose_glyphs,
+    propagate_anchors,
+)
+from ufotweak.engine import ENGINE_OPTIONS, process_glyph_files
+from ufotweak.groups import GroupIndex
+from ufotweak.index import GlyphIndex
+from ufotweak.parts import (
+    FONTINFO,
+    LIB,
+    GROUPS,
+    KERNING,
+    FEATURES,
+    GLYPHS,
+    open_font,
+    save_font,
+)
+from ufotweak.references import (
+    COMPONENT_INFO_KEY,
+    METRICS_KEYS,
+    layer_references,
+    loaded_glyph_count,
+    split_metrics_key,
+)
 from io import StringIO
 
-try:
-    from glyphConstruction import GlyphConstructionBuilder
-except ImportError:
-    pass
-    # print("Cannot use glyphConstruction as it is not installed.")
+# Commands tweaking UFOs
+FONT_COMMANDS = ("fontinfo", "glyph", "lib", "run")
 
 INFO_ATTR_BITLIST = {
     "openTypeHeadFlags": (0, 16),
@@ -26,124 +51,182 @@ INFO_ATTR_BITLIST = {
     "openTypeOSUnicodeRanges": (0, 127),
 }
 
+# Parts of the font touched by each glyph command option
+GLYPH_OPTION_PARTS = {
+    "drop": {GLYPHS, LIB, GROUPS, KERNING, FEATURES},
+    "drop_txt": {GLYPHS, LIB, GROUPS, KERNING, FEATURES},
+    "set_unicode": {GLYPHS},
+    "drop_unicode": {GLYPHS},
+    "set_postscriptName": {LIB},
+    "drop_postscriptName": {LIB},
+    "drop_anchor": {GLYPHS},
+    "rename_anchor": {GLYPHS},
+    "copy_anchors": {GLYPHS},
+    "drop_lib": {GLYPHS},
+    "construction": {GLYPHS},
+    "copy_width": {GLYPHS},
+    "propagateAnchors": {GLYPHS},
+    "decompose": {GLYPHS},
+    "rename": {GLYPHS, LIB, GROUPS, KERNING, FEATURES},
+    "rename_glyphsdata": {GLYPHS, LIB, GROUPS, KERNING, FEATURES},
+    "swap_unicodes": {GLYPHS},
+    "swap_components": {GLYPHS},
+    "round": {GLYPHS},
+}
+
+# Glyph command options that only tweak the glyphs of the default layer
+DEFAULT_LAYER_OPTIONS = frozenset(
+    [
+        "set_unicode",
+        "drop_unicode",
+        "drop_anchor",
+        "rename_anchor",
+        "copy_anchors",
+        "construction",
+        "copy_width",
+        "propagateAnchors",
+        "decompose",
+        "swap_unicodes",
+        "swap_components",
+        "round",
+    ]
+)
+
 
 class Renamer:
-    def __init__(self, font, mapping):
+    def __init__(self, font, mapping, group_index=None):
         self.font = font
         self.mapping = mapping
+        self.group_index = group_index
 
     @classmethod
-    def from_glyphsdata(cls, font, glyphsdata):
-        from ufo2ft.util import makeUnicodeToGlyphNameMapping
-        import xml.etree.ElementTree
-
-        with open(glyphsdata) as glyphdata_file:
-            glyph_data = xml.etree.ElementTree.parse(glyphdata_file).getroot()
-        font_unicodes = makeUnicodeToGlyphNameMapping(font)
-        gd_unicodes = dict()
-        for glyph in glyph_data:
-            name = glyph.attrib["name"]
-            uni = glyph.attrib.get("unicode")
-            alt_names = glyph.attrib.get("altNames")
-            prod_name = glyph.attrib.get("production")
-            if uni:
-                uni = int(uni, 16)
-                gd_unicodes[uni] = []
-                if name:
-                    gd_unicodes[uni].append(name)
-                if alt_names:
-                    gd_unicodes[uni].extend(alt_names.split(", "))
-                if prod_name:
-                    gd_unicodes[uni].append(prod_name)
+    def from_glyphsdata(cls, font, glyphsdata, group_index=None, glyph_index=None):
+        from ufo2ft.errors import InvalidFontData
+        from ufo2ft.util import makeOfficialGlyphOrder
+
+        if glyph_index is None:
+            glyph_index = GlyphIndex(font)
+        gd_unicodes = glyphsdata_unicodes(glyphsdata)
+        # Same as ufo2ft's makeUnicodeToGlyphNameMapping, without loading glyphs
+        glyph_unicodes = glyph_index.unicodes()
+        font_unicodes = dict()
+        for glyph_name in makeOfficialGlyphOrder(font):
+            for uni in glyph_unicodes[glyph_name]:
+                if uni in font_unicodes:
+                    raise InvalidFontData(
+                        "cannot map '%s' to U+%04X; already mapped to '%s'"
+                        % (glyph_name, uni, font_unicodes[uni])
+                    )
+                font_unicodes[uni] = glyph_name
         mapping = dict()
         for uni, ufo_name in font_unicodes.items():
             if uni in gd_unicodes:
                 mapping[ufo_name] = gd_unicodes[uni][0]
-        return cls(font, mapping)
+        return cls(font, mapping, group_index)
 
     def rename(self):
-        glyph_names = set(g.name for g in self.font)
+        glyph_names = set(self.font.keys())
         # Update with glyphOrder and postscriptNames in case the features have old names
-        glyph_names.update(set(self.font.lib.get("public.glyphOrder")))
-        glyph_names.update(set(self.font.lib.get("public.postscriptNames")))
-        for layer in self.font.layers:
-            for glyph in [g for g in layer]:
-                for component in glyph.components:
-                    if component.baseGlyph in self.mapping:
-                        component.baseGlyph = self.mapping[component.baseGlyph]
-                if glyph.name in self.mapping:
-                    new_name = self.mapping[glyph.name]
-                    if new_name in layer:
-                        print(f"{new_name} already in font")
-                        continue
-                    layer.renameGlyph(glyph.name, new_name)
-
-                comp_info = glyph.lib.get("com.schriftgestaltung.Glyphs.ComponentInfo")
-                if comp_info:
-                    for ci in comp_info:
-                        name = ci.get("name")
-                        if name in self.mapping:
-                            ci["name"] = self.mapping[name]
-
-                mks = [
-                    f"com.schriftgestaltung.Glyphs.glyph.{m}MetricsKey"
-                    for m in ["left", "right", "width"]
-                ]
-                for mk in mks:
-                    value = glyph.lib.get(mk)
-                    if not value:
-                        continue
-                    prefix = ""
-                    key = value
-                    if value.startswith("="):
-                        key = value[1:]
-                        prefix = "="
-                    elif value.startswith("|="):
-                        key = value[2:]
-                        prefix = "|="
-
-                    if key in self.mapping:
-                        glyph.lib[mk] = prefix + self.mapping[key]
-
-        # Kerning
-        group_mapping = dict()
-        for group_name, group in list(self.font.groups.items()):
-            for old, new in self.mapping.items():
-                if old in group:
-                    index = group.index(old)
-                    group.remove(old)
-                    group.insert(index, new)
-
-            for old, new in self.mapping.items():
-                if group_name[len("public.kern1."):] == old:
-                    new_group_name = group_name[: len("public.kern1.")] + new
-                    del self.font.groups[group_name]
-                    self.font.groups[new_group_name] = group
-                    group_mapping[group_name] = new_group_name
-                    break
-        # count = 0
-        mapping = self.mapping
-        mapping.update(group_mapping)
-        for pair in list(self.font.kerning.keys()):
-            old_pair = pair
-            value = self.font.kerning[old_pair]
-            for old, new in mapping.items():
-                if (old, old) == pair:
-                    pair = (new, new)
-                    break
-                elif old == pair[0]:
-                    pair = (new, pair[1])
-                    if pair[1] != old_pair[1]:
-                        break
-                elif old == pair[1]:
-                    pair = (pair[0], new)
-                    if pair[0] != old_pair[0]:
-                        break
-
-            if old_pair != pair:
-                del self.font.kerning[old_pair]
-                self.font.kerning[pair] = value
+        glyph_names.update(self.font.lib.get("public.glyphOrder", ()))
+        glyph_names.update(self.font.lib.get("public.postscriptNames", ()))
+        with instrument.step("rename.glyphs", self.font):
+            self._rename_glyphs()
+
+        with instrument.step("rename.groups"):
+            group_mapping = self._rename_groups()
+        with instrument.step("rename.kerning"):
+            self._rename_kerning(group_mapping)
+
+        with instrument.step("rename.features"):
+            self._rename_features(glyph_names, group_mapping)
+
+        with instrument.step("rename.lib"):
+            self._rename_lib()
+
+    def _rename_lib(self):
+        glyph_order = [
+            self.mapping.get(n, n) for n in self.font.lib.get("public.glyphOrder", ())
+        ]
+        if glyph_order:
+            self.font.lib["public.glyphOrder"] = glyph_order
+
+        postscript_names = {
+            self.mapping.get(k, k): v
+            for k, v in self.font.lib.get("public.postscriptNames", {}).items()
+        }
+        if postscript_names:
+            self.font.lib["public.postscriptNames"] = postscript_names
+
+        skip_export_glyphs = [
+            self.mapping.get(n, n)
+            for n in self.font.lib.get("public.skipExportGlyphs", ())
+        ]
+        if skip_export_glyphs:
+            self.font.lib["public.skipExportGlyphs"] = skip_export_glyphs
+
+    def _rename_glyphs(self):
+        layers = list(self.font.layers)
+        reader = self.font.reader
+        if (
+            len(layers) > 1
+            and reader is not None
+            and reader.fileStructure is UFOFileStructure.PACKAGE
+        ):
+            with ThreadPoolExecutor() as executor:
+                list(executor.map(self._rename_layer, layers))
+        else:
+            for layer in layers:
+                self._rename_layer(layer)
+
+    def _rename_layer(self, layer):
+        # Only glyphs referencing renamed glyphs are visited, unloaded glyphs
+        # that don't are left unloaded
+        users = layer_references(layer, self.mapping)
+        visit = set()
+        for names in users.values():
+            visit.update(names)
+        for name in visit:
+            self._rename_references(layer[name])
+
+        # Glyphs are taken out before being inserted with their new names, so
+        # that glyphs can swap names
+        renames, skipped = applicable_renames(layer.keys(), self.mapping)
+        for new in skipped:
+            print(f"{new} already in font")
+        renamed = {new: layer.pop(old) for old, new in renames.items()}
+        for new, glyph in renamed.items():
+            layer.insertGlyph(glyph, new, overwrite=False, copy=False)
+
+    def _rename_references(self, glyph):
+        for component in glyph.components:
+            if component.baseGlyph in self.mapping:
+                component.baseGlyph = self.mapping[component.baseGlyph]
+
+        comp_info = glyph.lib.get(COMPONENT_INFO_KEY)
+        if comp_info:
+            for ci in comp_info:
+                name = ci.get("name")
+                if name in self.mapping:
+                    ci["name"] = self.mapping[name]
+
+        for mk in METRICS_KEYS:
+            value = glyph.lib.get(mk)
+            if not value:
                 continue
+            prefix, key = split_metrics_key(value)
+            if key in self.mapping:
+                glyph.lib[mk] = prefix + self.mapping[key]
+
+    def _rename_features(self, glyph_names, group_mapping):
+        from ufotweak.features import rename_glyphs_in_features
+
+        # Rename tokens in place, only parse the features when that isn't possible
+        text = rename_glyphs_in_features(
+            str(self.font.features), self.mapping, group_mapping
+        )
+        if text is not None:
+            self.font.features.text = text
+            return
 
         def recursive_fea_glyph_rename(statement):
             if hasattr(statement, "statements"):
@@ -202,28 +285,183 @@ class Renamer:
                         )
             return statement
 
+        from fontTools.feaLib.parser import Parser
+
         ast = Parser(StringIO(str(self.font.features)), glyphNames=glyph_names).parse()
         ast = recursive_fea_glyph_rename(ast)
         self.font.features.text = ast.asFea()
 
-        glyph_order = [
-            self.mapping.get(n, n) for n in self.font.lib.get("public.glyphOrder")
-        ]
-        if glyph_order:
-            self.font.lib["public.glyphOrder"] = glyph_order
+    def _rename_groups(self):
+        if self.group_index is None:
+            self.group_index = GroupIndex(self.font.groups)
+        self.group_index.rename_glyphs(self.mapping)
 
-        postscript_names = {
-            self.mapping.get(k, k): v
-            for k, v in self.font.lib.get("public.postscriptNames", {}).items()
+        group_mapping = dict()
+        for group_name in self.font.groups:
+            prefix = group_name[: len("public.kern1.")]
+            if prefix not in ("public.kern1.", "public.kern2."):
+                continue
+            new = self.mapping.get(group_name[len(prefix):])
+            if new is not None:
+                group_mapping[group_name] = prefix + new
+        group_mapping, skipped = applicable_renames(self.font.groups, group_mapping)
+        for new in skipped:
+            print(f"{new} already in groups")
+        self.group_index.rename_groups(group_mapping)
+        return group_mapping
+
+    def _rename_kerning(self, group_mapping):
+        # Both sides of each pair are looked up in one mapping of glyph and
+        # kerning group names, so the kerning is rebuilt in a single pass.
+        mapping = dict(self.mapping)
+        mapping.update(group_mapping)
+        kerning = {
+            (mapping.get(left, left), mapping.get(right, right)): value
+            for (left, right), value in self.font.kerning.items()
         }
-        if postscript_names:
-            self.font.lib["public.postscriptNames"] = postscript_names
+        self.font.kerning.clear()
+        self.font.kerning.update(kerning)
+
+
+def applicable_renames(names, mapping):
+    # Renames of mapping that can be done among names, and the new names that
+    # are skipped because a name that stays or another rename takes them. A
+    # skipped rename leaves its name taken, so this is repeated until no other
+    # rename is skipped.
+    names = set(names)
+    renames = {old: new for old, new in mapping.items() if old in names}
+    skipped = []
+    while True:
+        taken = names - set(renames)
+        new_names = set()
+        collisions = []
+        for old, new in renames.items():
+            if new in taken or new in new_names:
+                collisions.append(old)
+            new_names.add(new)
+        if not collisions:
+            return renames, skipped
+        for old in collisions:
+            skipped.append(renames.pop(old))
 
-        skip_export_glyphs = [
-            self.mapping.get(n, n) for n in self.font.lib.get("public.skipExportGlyphs")
-        ]
-        if skip_export_glyphs:
-            self.font.lib["public.skipExportGlyphs"] = skip_export_glyphs
+
+def rename_collisions(glyph_names, mapping):
+    # New names Renamer can't give in a layer with glyph_names: names of glyphs
+    # that aren't renamed and names given to several glyphs
+    _, skipped = applicable_renames(glyph_names, mapping)
+    return set(skipped)
+
+
+class RenamePlan:
+    # Rename mappings checked once against the glyph names of every layer of
+    # every master before any is renamed, so that masters are all renamed the
+    # same way or not at all. Changes are ("drop", glyph names) and ("rename",
+    # mapping), applied in order.
+    def __init__(self, changes):
+        self.changes = changes
+
+    def _check_path(self, path):
+        # Only the layer contents are read
+        font = open_font(path, parts=())
+        try:
+            layers_glyph_names = {
+                layer.name: set(layer.keys()) for layer in font.layers
+            }
+        finally:
+            font.close()
+        collisions = dict()
+        for layer_name, glyph_names in layers_glyph_names.items():
+            for change, value in self.changes:
+                if change == "drop":
+                    glyph_names = glyph_names.difference(value)
+                    continue
+                layer_collisions = rename_collisions(glyph_names, value)
+                if layer_collisions:
+                    collisions.setdefault(layer_name, set()).update(layer_collisions)
+                glyph_names = {value.get(n, n) for n in glyph_names}
+        return collisions
+
+    def check(self, paths):
+        # Collisions by path and layer name, of the masters that would diverge
+        with ThreadPoolExecutor() as executor:
+            results = executor.map(self._check_path, paths)
+        return {
+            path: collisions
+            for path, collisions in zip(paths, results)
+            if collisions
+        }
+
+
+def check_renames(paths, options):
+    # False when the renames of options can't be applied to all paths alike
+    changes = glyph_name_changes(options)
+    if not any(change == "rename" for change, _ in changes):
+        return True
+    collisions = RenamePlan(changes).check(paths)
+    for path, layers_collisions in collisions.items():
+        for layer_name, names in sorted(layers_collisions.items()):
+            print(
+                f"{path}: {', '.join(sorted(names))} already in layer {layer_name}",
+                file=sys.stderr,
+            )
+    if collisions:
+        print("Rename aborted, no UFO was changed.", file=sys.stderr)
+        return False
+    return True
+
+
+def drop_glyphs(font, glyph_names, group_index=None):
+    glyph_names = set(glyph_names)
+    font_glyph_names = set(font.keys())
+    font_glyph_names.update(font.lib.get("public.glyphOrder", ()))
+    font_glyph_names.update(font.lib.get("public.postscriptNames", ()))
+
+    for layer in font.layers:
+        layer_glyph_names = glyph_names.intersection(layer.keys())
+        if not layer_glyph_names:
+            continue
+        # Glyphs using dropped glyphs as components keep their outlines
+        graph = ComponentGraph.from_layer(layer)
+        users = set()
+        for glyph_name in layer_glyph_names:
+            users.update(graph.users.get(glyph_name, ()))
+        decompose_components(layer, users - glyph_names, layer_glyph_names)
+        for glyph_name in layer_glyph_names:
+            del layer[glyph_name]
+
+    for key in ("public.glyphOrder", "public.skipExportGlyphs"):
+        if font.lib.get(key):
+            font.lib[key] = [n for n in font.lib[key] if n not in glyph_names]
+
+    postscriptNames = font.lib.get("public.postscriptNames")
+    if postscriptNames:
+        font.lib["public.postscriptNames"] = {
+            k: v for k, v in postscriptNames.items() if k not in glyph_names
+        }
+
+    # Kerning groups left empty are dropped along with their kerning
+    if group_index is None:
+        group_index = GroupIndex(font.groups)
+    dropped = set(glyph_names)
+    for group_name in group_index.remove_glyphs(glyph_names):
+        if not font.groups[group_name] and group_name.startswith("public.kern"):
+            del font.groups[group_name]
+            dropped.add(group_name)
+
+    kerning = {
+        (left, right): value
+        for (left, right), value in font.kerning.items()
+        if left not in dropped and right not in dropped
+    }
+    if len(kerning) != len(font.kerning):
+        font.kerning.clear()
+        font.kerning.update(kerning)
+
+    from ufotweak.features import drop_glyphs_from_features
+
+    font.features.text = drop_glyphs_from_features(
+        font.features.text, glyph_names, font_glyph_names
+    )
 
 
 def process_fontinfo(font, options):
@@ -243,7 +481,6 @@ def process_fontinfo(font, options):
                 setattr(font.info, key, value)
             continue
         if options.drop and key in options.drop:
-            print("drop key", key)
             delattr(font.info, key)
             continue
         else:
@@ -267,32 +504,29 @@ def process_fontinfo(font, options):
 
 
 def process_glyph(font, options):
-    if options.drop:
-        glyph_names = options.drop.replace(", ", ",").split(",")
-        for glyph_name in glyph_names:
-            if glyph_name in font:
-                del font[glyph_name]
-                # TODO: remove glyph from features, groups and kerning
-
-            glyphOrder = font.lib.get("public.glyphOrder")
-            if glyph_name in glyphOrder :
-                font.lib["public.glyphOrder"].remove(glyph_name)
-
-            postscriptNames = font.lib.get("public.postscriptNames")
-            if postscriptNames and glyph_name in postscriptNames:
-                del font.lib["public.postscriptNames"][glyph_name]
-
-            for group_name, values in list(font.groups.items()):
-                if glyph_name in values:
-                    values.remove(glyph_name)
-
+    group_index = None
+    if any(
+        (options.drop, options.drop_txt, options.rename, options.rename_glyphsdata)
+    ):
+        group_index = GroupIndex(font.groups)
+    glyph_index = None
+    if any(
+        (
+            options.drop_anchor,
+            options.rename_anchor,
+            options.drop_lib,
+            options.rename_glyphsdata,
+            options.swap_components,
+        )
+    ):
+        glyph_index = GlyphIndex(font)
+    if options.drop or options.drop_txt:
+        drop_glyphs(font, dropped_glyph_names(options), group_index)
     if options.set_unicode:
         glyphs_unicodes = options.set_unicode.split(",")
         for glyph_unicodes in glyphs_unicodes:
             glyph_name, unicodes = glyph_unicodes.split("=")
             font[glyph_name].unicodes = [int(c, 16) for c in unicodes.split(":")]
-            print(glyph_name, unicodes.split(":"))
-            print(glyph_name, font[glyph_name].unicodes)
     if options.drop_unicode:
         glyphs_names = options.drop_unicode.split(",")
         for glyph_name in glyphs_names:
@@ -310,10 +544,17 @@ def process_glyph(font, options):
             del font.lib["public.postscriptNames"][glyph_name]
     if options.drop_anchor:
         anchor_name, glyph_names = options.drop_anchor.split(":")
+        # Only the glyphs with the anchor are loaded
+        anchor_index = glyph_index.anchor_index(
+            None if anchor_name == "*" else [anchor_name]
+        )
+        anchor_glyph_names = set().union(*anchor_index.values())
         if glyph_names == "*":
-            glyph_names = [g.name for g in font]
+            glyph_names = anchor_glyph_names
         else:
-            glyph_names = glyph_names.split(",")
+            glyph_names = [
+                n for n in glyph_names.split(",") if n in anchor_glyph_names
+            ]
         for glyph_name in glyph_names:
             glyph = font[glyph_name]
             if anchor_name == "*":
@@ -324,8 +565,8 @@ def process_glyph(font, options):
                 glyph.anchors.remove(anchor)
     if options.rename_anchor:
         mapping = dict(kv.split(":") for kv in options.rename_anchor.split(","))
-        for glyph in font:
-            for anchor in glyph.anchors:
+        for glyph_name in glyph_index.glyphs_with_anchors(mapping):
+            for anchor in font[glyph_name].anchors:
                 if anchor.name in mapping:
                     anchor.name = mapping[anchor.name]
     if options.copy_anchors:
@@ -337,25 +578,25 @@ def process_glyph(font, options):
         ])
     if options.drop_lib:
         lib_key, glyph_names = options.drop_lib.split(":")
-        if glyph_names == "*":
-            glyph_names = set()
-            for layer in [layer for layer in font.layers]:
-                for glyph in layer:
-                    glyph_names.add(glyph.name)
-        else:
+        if glyph_names != "*":
             glyph_names = set(glyph_names.split(","))
-        for glyph_name in glyph_names:
-            for layer in font.layers:
-                if glyph_name in layer:
-                    glyph = layer[glyph_name]
-                    if lib_key == "*":
-                        del glyph.lib
-                    elif lib_key in glyph.lib:
-                        del glyph.lib[lib_key]
+        for layer in font.layers:
+            if glyph_names == "*":
+                layer_glyph_names = glyph_index.glyphs_with_lib_key(
+                    None if lib_key == "*" else lib_key, layer.name
+                )
+            else:
+                layer_glyph_names = [n for n in glyph_names if n in layer]
+            for glyph_name in layer_glyph_names:
+                glyph = layer[glyph_name]
+                if lib_key == "*":
+                    glyph.lib.clear()
+                elif lib_key in glyph.lib:
+                    del glyph.lib[lib_key]
     if options.construction:
         try:
-            GlyphConstructionBuilder
-        except NameError:
+            from glyphConstruction import GlyphConstructionBuilder
+        except ImportError:
             print("glyphConstruction is not installed.")
         else:
             for construction in options.construction:
@@ -373,20 +614,29 @@ def process_glyph(font, options):
         mapping = dict(kv.split(":") for kv in options.copy_width.split(","))
         for source, target in mapping.items():
             font[target].width = font[source].width
+    # Only --with-dependents needs the component graph of the whole layer,
+    # otherwise only the glyphs the given glyphs are built from are read
+    component_graph = None
+    if options.with_dependents and (options.propagateAnchors or options.decompose):
+        component_graph = ComponentGraph.from_index(glyph_index or GlyphIndex(font))
     if options.propagateAnchors:
         glyph_names = options.propagateAnchors.split(",")
-        philter = PropagateAnchorsFilter(include=glyph_names)
-        print(philter(font))
+        if component_graph is not None:
+            glyph_names = component_graph.dependents_closure(glyph_names)
+        propagate_anchors(font, glyph_names, component_graph)
     if options.decompose:
         glyph_names = options.decompose.split(",")
-        philter = DecomposeComponentsFilter(include=glyph_names)
-        print(philter(font))
+        if component_graph is not None:
+            glyph_names = component_graph.dependents_closure(glyph_names)
+        decompose_glyphs(font, glyph_names, component_graph)
     if options.rename:
         mapping = dict(kv.split(":") for kv in options.rename.split(","))
-        renamer = Renamer(font, mapping)
+        renamer = Renamer(font, mapping, group_index)
         renamer.rename()
     if options.rename_glyphsdata:
-        renamer = Renamer.from_glyphsdata(font, options.rename_glyphsdata)
+        renamer = Renamer.from_glyphsdata(
+            font, options.rename_glyphsdata, group_index, glyph_index
+        )
         renamer.rename()
     if options.swap_unicodes:
         mapping = dict(kv.split(":") for kv in options.swap_unicodes.split(","))
@@ -397,9 +647,8 @@ def process_glyph(font, options):
     if options.swap_components:
         mapping = dict(kv.split(":") for kv in options.swap_components.split(","))
         glyphs = [
-            g
-            for g in font
-            if g.components and any(c.baseGlyph in mapping for c in g.components)
+            font[glyph_name]
+            for glyph_name in glyph_index.glyphs_with_components(mapping)
         ]
         for old, new in mapping.items():
             for glyph in glyphs:
@@ -411,26 +660,14 @@ def process_glyph(font, options):
     if options.round:
         glyphnames = options.round.split(",")
         if "*" in glyphnames:
-            glyphnames = [glyph.name for glyph in font]
+            glyphnames = list(font.keys())
+        from ufotweak.rounding import round_glyphs
 
-        def round_glyph(glyph):
-            recpen = RecordingPen()
-            roundpen = RoundingPen(recpen)
-            glyph.draw(roundpen)
-            glyph.clearContours()
-            glyph.clearComponents()
-            recpen.replay(glyph.getPen())
-            for anchor in glyph.anchors:
-                anchor.x = round(anchor.x)
-                anchor.y = round(anchor.y)
-
-        for name in glyphnames:
-            round_glyph(font[name])
+        round_glyphs([font[name] for name in glyphnames])
 
 
 def process_lib(font, options):
     if options.update:
-        print(options.update)
         lib = json.loads(options.update)
         font.lib.update(lib)
     if options.dump_key:
@@ -441,9 +678,291 @@ def process_lib(font, options):
             del font.lib[key]
 
 
-def process_designspace(designspace, options):
-    if options.instance:
-        instances = dict(a.split(":") for a in options.instance.split(","))
+def designspace_source_paths(document, source_names=None, layer_names=None):
+    # UFO paths of the selected sources, sources sharing a UFO with other
+    # layers are opened and tweaked once with their UFO
+    paths = []
+    for source in document.sources:
+        if source_names and not source_names.intersection(
+            (source.name, source.filename)
+        ):
+            continue
+        if layer_names and (source.layerName or "public.default") not in layer_names:
+            continue
+        if source.path not in paths:
+            paths.append(source.path)
+    return paths
+
+
+def default_layer_options(options):
+    # Command line flags of the options only tweaking the default layer
+    flags = []
+    if options.command == "glyph":
+        for option in sorted(DEFAULT_LAYER_OPTIONS):
+            if getattr(options, option):
+                flags.append("--" + option.replace("_", "-"))
+    elif options.command == "run":
+        for operation in options.operations:
+            flags.extend(default_layer_options(operation))
+    return flags
+
+
+def parse_args(parser, args):
+    # The RECIPE of run takes the first positional arguments with its UFOs, the
+    # UFOs given after run options are left over and added to the paths
+    options, extras = parser.parse_known_args(args)
+    if extras and options.command == "run":
+        unrecognized = [arg for arg in extras if arg.startswith("-")]
+        if not unrecognized:
+            options.paths.extend(extras)
+            return options
+        extras = unrecognized
+    if extras:
+        parser.error(f"unrecognized arguments: {' '.join(extras)}")
+    return options
+
+
+def parse_designspace_args(options, parser):
+    # Designspace options given after DESIGNSPACE end up in the command, they
+    # are parsed again before DESIGNSPACE. The --jobs, --lazy, --profile and
+    # --cprofile options given to the command apply to the designspace.
+    commands = [i for i, arg in enumerate(options.tweak) if arg in FONT_COMMANDS]
+    if not commands:
+        parser.error(f"designspace needs one of {', '.join(FONT_COMMANDS)}")
+    if commands[0]:
+        options = parser.parse_args(
+            [
+                "designspace",
+                *options.tweak[: commands[0]],
+                options.designspace,
+                *options.tweak[commands[0] :],
+            ]
+        )
+    tweak = parse_args(parser, options.tweak)
+    if hasattr(tweak, "jobs"):
+        options.jobs = tweak.jobs
+    options.lazy = options.lazy or tweak.lazy
+    options.profile = tweak.profile or options.profile
+    options.cprofile = tweak.cprofile or options.cprofile
+    return options
+
+
+def process_designspace(options, parser):
+    from fontTools import designspaceLib
+
+    document = designspaceLib.DesignSpaceDocument.fromfile(options.designspace)
+    source_names = set(options.source.split(",")) if options.source else None
+    layer_names = set(options.layer.split(",")) if options.layer else None
+    paths = designspace_source_paths(document, source_names, layer_names)
+
+    tweak = parse_args(parser, options.tweak)
+    # Worker processes profile their fonts when the designspace is profiled
+    tweak.profile = options.profile
+    if tweak.paths:
+        parser.error("designspace tweaks the designspace sources, not UFO paths")
+    if tweak.command == "run":
+        tweak.operations = load_recipe(tweak.recipe, parser)
+    if layer_names and layer_names != {"public.default"}:
+        flags = default_layer_options(tweak)
+        if flags:
+            parser.error(
+                f"--layer can't be used with {', '.join(flags)}, the default "
+                "layer of the UFOs would be tweaked instead"
+            )
+
+    if not check_renames(paths, tweak):
+        return 1
+
+    parts = None
+    if options.lazy:
+        parts = touched_parts(tweak)
+    jobs = options.jobs or os.cpu_count()
+    if jobs > 1 and len(paths) > 1:
+        return process_paths(paths, tweak, parts, jobs)
+    for path in paths:
+        print(f"# {path}")
+        process_path(path, tweak, parts)
+
+
+def use_glyph_engine(path, options):
+    # Glyph commands the engine can run on the .glif files of a UFO directory
+    if options.command != "glyph" or options.glyph_jobs is None:
+        return False
+    glyph_options = [
+        option for option in GLYPH_OPTION_PARTS if getattr(options, option)
+    ]
+    return (
+        bool(glyph_options)
+        and ENGINE_OPTIONS.issuperset(glyph_options)
+        and os.path.isdir(path)
+    )
+
+
+def process_path(path, options, parts=None):
+    if use_glyph_engine(path, options):
+        with instrument.step("glyph_engine", ufo_path=path) as record:
+            changed = process_glyph_files(path, options, options.glyph_jobs)
+            record["glyphs_changed"] = sum(len(names) for names in changed.values())
+        return
+
+    with instrument.step("load") as record:
+        record["path"] = path
+        font = open_font(path, parts)
+        record["glyphs_loaded"] = loaded_glyph_count(font)
+    try:
+        process_font(font, options)
+        with instrument.step("save", ufo_path=path):
+            save_font(font, path, parts)
+    finally:
+        font.close()
+
+
+def process_font(font, options):
+    with instrument.step(f"process_{options.command}", font):
+        _process_font(font, options)
+
+
+def _process_font(font, options):
+    if options.command == "fontinfo":
+        process_fontinfo(font, options)
+    elif options.command == "glyph":
+        process_glyph(font, options)
+    elif options.command == "lib":
+        process_lib(font, options)
+    elif options.command == "run":
+        for operation in options.operations:
+            process_font(font, operation)
+
+
+def load_recipe(path, parser):
+    # Parse the recipe commands once, with the command line parser
+    with open(path, "r") as fp:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                parser.error("PyYAML is not installed, use a JSON recipe.")
+            recipe = yaml.safe_load(fp)
+        else:
+            recipe = json.load(fp)
+    if isinstance(recipe, dict):
+        recipe = recipe.get("operations", [])
+
+    operations = []
+    for operation in recipe:
+        if isinstance(operation, dict):
+            operation = _recipe_args(operation)
+        operation = [str(arg) for arg in operation]
+        if not operation or operation[0] not in ("fontinfo", "glyph", "lib"):
+            parser.error(f"Unsupported recipe command: {operation}")
+        operations.append(parser.parse_args(operation))
+    return operations
+
+
+def _recipe_args(operation):
+    # {"glyph": {"drop": "a,b", "round": "*"}} to command line arguments
+    ((command, recipe_options),) = operation.items()
+    args = [command]
+    for key, value in recipe_options.items():
+        if not key.startswith("-"):
+            key = "--" + key.replace("_", "-")
+        if value is False or value is None:
+            continue
+        args.append(key)
+        if value is True:
+            continue
+        if isinstance(value, (list, tuple)):
+            args.extend(value)
+        elif isinstance(value, dict):
+            args.append(json.dumps(value))
+        else:
+            args.append(value)
+    return args
+
+
+def _process_path_captured(path, options, parts):
+    # Run in a worker process, output and profile are returned to be reported
+    # per font
+    output = StringIO()
+    ok = True
+    if options.profile:
+        instrument.start()
+    with redirect_stdout(output):
+        try:
+            process_path(path, options, parts)
+        except Exception:
+            traceback.print_exc(file=output)
+            ok = False
+    report = instrument.stop() if options.profile else None
+    return output.getvalue(), ok, report
+
+
+def process_paths(paths, options, parts=None, jobs=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            path: executor.submit(_process_path_captured, path, options, parts)
+            for path in paths
+        }
+        for path, future in futures.items():
+            report = None
+            try:
+                output, ok, report = future.result()
+            except Exception as e:
+                output, ok = f"{type(e).__name__}: {e}\n", False
+            instrument.add_report("worker", report, path)
+            print(f"# {path}")
+            if output:
+                print(output, end="")
+            if not ok:
+                failed.append(path)
+    for path in failed:
+        print(f"Failed: {path}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def touched_parts(options):
+    parts = set()
+    if options.command == "fontinfo":
+        parts.add(FONTINFO)
+    elif options.command == "glyph":
+        for option, option_parts in GLYPH_OPTION_PARTS.items():
+            if getattr(options, option):
+                parts.update(option_parts)
+    elif options.command == "lib":
+        if options.update or options.drop:
+            parts.add(LIB)
+    elif options.command == "run":
+        for operation in options.operations:
+            parts.update(touched_parts(operation))
+    return parts
+
+
+def dropped_glyph_names(options):
+    glyph_names = []
+    if options.drop:
+        glyph_names.extend(options.drop.replace(", ", ",").split(","))
+    if options.drop_txt:
+        with open(options.drop_txt, "r") as fp:
+            glyph_names.extend(n.strip() for n in fp.readlines() if n.strip())
+    return glyph_names
+
+
+def glyph_name_changes(options):
+    # Glyph drops and renames of options in the order process_glyph runs them
+    changes = []
+    if options.command == "glyph":
+        if options.drop or options.drop_txt:
+            changes.append(("drop", set(dropped_glyph_names(options))))
+        if options.rename:
+            mapping = dict(kv.split(":") for kv in options.rename.split(","))
+            changes.append(("rename", mapping))
+    elif options.command == "run":
+        for operation in options.operations:
+            changes.extend(glyph_name_changes(operation))
+    return changes
 
 
 def _parse_bitlist(string):
@@ -452,7 +971,6 @@ def _parse_bitlist(string):
         return []
     # value = [1 << int(i.strip()) for i in string[1:-1].split(",")]
     value = [int(i) for i in string[1:-1].split(",")]
-    print(value)
     return value
 
 
@@ -465,9 +983,7 @@ def _parse_dict(string):
     pass
 
 
-def main(args=None):
-    if not args:
-        args = sys.argv[1:]
+def build_parser():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(
         dest="command",
@@ -528,6 +1044,11 @@ def main(args=None):
         metavar="STRING",
         help="Comma-separated list of glyph names to drop",
     )
+    parser_glyph.add_argument(
+        "--drop-txt",
+        metavar="GLYPHLISTFILE",
+        help="File with line-separated list of glyph names to drop",
+    )
     parser_glyph.add_argument(
         "--set-unicode",
         metavar="STRING",
@@ -606,6 +1127,12 @@ def main(args=None):
         metavar="STring",
         help="<glyph>[,<glyph],...]",
     )
+    parser_glyph.add_argument(
+        "--with-dependents",
+        action="store_true",
+        help="Also propagate anchors or decompose the glyphs using the "
+        "--propagateAnchors or --decompose glyphs as components, recursively.",
+    )
     parser_glyph.add_argument(
         "--rename",
         metavar="STRING",
@@ -624,6 +1151,13 @@ def main(args=None):
         "<glyph> is a glyph that should be rounded.\n"
         "<glyph> may be '*' for any.",
     )
+    parser_glyph.add_argument(
+        "--glyph-jobs",
+        metavar="N",
+        type=int,
+        help="Run --round, --drop-anchor and --drop-lib on the glyph files in "
+        "N worker processes, 0 for all CPUs. Other options run in process.",
+    )
 
     # UFO lib command
     parser_lib = subparsers.add_parser(
@@ -652,67 +1186,186 @@ def main(args=None):
         help="Comma separated list of lib keys to drop.",
     )
 
+    # run command
+    parser_run = subparsers.add_parser(
+        "run",
+        description="Run a recipe of fontinfo, glyph and lib commands, "
+        "loading and saving each UFO once.",
+    )
+    parser_run.add_argument(
+        "recipe",
+        metavar="RECIPE",
+        help="JSON or YAML file with a list of commands, each one a list of "
+        "command line arguments or a mapping of the command to its options.",
+    )
+    parser_run.add_argument(
+        dest="paths",
+        metavar="UFO",
+        nargs="*",
+        help="UFOs to be tweaked.",
+    )
+
+    for subparser in (parser_fontinfo, parser_glyph, parser_lib, parser_run):
+        subparser.add_argument(
+            "--jobs",
+            metavar="N",
+            type=int,
+            default=argparse.SUPPRESS,
+            help="Number of UFOs processed in parallel, 0 for all CPUs, 1 by "
+            "default.",
+        )
+        subparser.add_argument(
+            "--lazy",
+            action="store_true",
+            help="Only load the parts of the UFO used by the command and only "
+            "write back the parts it changes.",
+        )
+
+    # serve command
+    parser_serve = subparsers.add_parser(
+        "serve",
+        description="Serve commands sent by ufotweak-client, keeping the UFOs "
+        "open between commands.",
+    )
+    parser_serve.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Unix socket to listen on, $UFOTWEAK_SOCKET or serve.sock in the "
+        "ufotweak cache directory by default.",
+    )
+    parser_serve.add_argument(
+        "--max-fonts",
+        metavar="N",
+        type=int,
+        default=16,
+        help="Number of UFOs kept open.",
+    )
+    parser_serve.add_argument(
+        "--max-memory",
+        metavar="MB",
+        type=int,
+        default=1024,
+        help="Total size on disk of the UFOs kept open.",
+    )
+
     # designspace command
     parser_designspace = subparsers.add_parser(
         "designspace",
-        description="Designspace",
+        description="Run a fontinfo, glyph, lib or run command on the source "
+        "UFOs of a designspace.",
     )
-    parser_fontinfo.add_argument(
+    parser_designspace.add_argument(
         "designspace",
         metavar="DESIGNSPACE",
-        nargs="*",
-        help="DESIGNSPACE to be tweaked.",
+        help="DESIGNSPACE whose sources are tweaked.",
     )
     parser_designspace.add_argument(
-        "--instance",
+        "--source",
         metavar="STRING",
-        help="Instance",
+        help="Comma separated list of source names or filenames to tweak.",
     )
     parser_designspace.add_argument(
-        "--source",
+        "--layer",
         metavar="STRING",
-        help="Source",
+        help="Comma separated list of source layer names whose UFOs are "
+        "tweaked, public.default for sources of default layers. Glyph options "
+        "only tweaking the default layer can't be used with other layers.",
+    )
+    parser_designspace.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=0,
+        help="Number of UFOs processed in parallel, all CPUs by default.",
+    )
+    parser_designspace.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Only load the parts of the UFOs used by the command and only "
+        "write back the parts it changes.",
     )
-    for attribute in ["name", "familyname", "stylename", "filename", "layer"]:
-        parser_designspace.add_argument(
-            "--%s" % attribute,
-            metavar="STRING",
-            help="Source or instance %s attribute" % attribute,
+    parser_designspace.add_argument(
+        "tweak",
+        metavar="COMMAND",
+        nargs=argparse.REMAINDER,
+        help="fontinfo, glyph, lib or run command and its options.",
+    )
+
+    for subparser in (
+        parser_fontinfo,
+        parser_glyph,
+        parser_lib,
+        parser_run,
+        parser_designspace,
+    ):
+        subparser.add_argument(
+            "--profile",
+            metavar="JSON",
+            help="Write the wall and CPU time, glyphs loaded and files written "
+            "of each step and the peak memory to JSON, - for stderr.",
         )
-    for instance_attribute in [
-        "postscriptfontname",
-        "stylemapfamilyname",
-        "stylemapstylename",
-    ]:
-        parser_designspace.add_argument(
-            "--%s" % instance_attribute,
-            metavar="STRING",
-            help="Instance %s attribute" % instance_attribute,
+        subparser.add_argument(
+            "--cprofile",
+            metavar="PSTATS",
+            help="Write cProfile statistics of the main process to PSTATS.",
         )
 
-    options = parser.parse_args(args)
+    return parser
+
+
+def main(args=None):
+    if not args:
+        args = sys.argv[1:]
+    parser = build_parser()
+    options = parse_args(parser, args)
 
-    print("command", options.command)
     if not options.command:
         return
+    if options.command == "serve":
+        from ufotweak.serve import serve
 
-    for path in options.paths:
-        if options.command != "designspace":
-            font = Font.open(path, lazy=False)
-        else:
-            designspace = None
-        if options.command == "fontinfo":
-            process_fontinfo(font, options)
-        elif options.command == "glyph":
-            process_glyph(font, options)
-        elif options.command == "lib":
-            process_lib(font, options)
-        elif options.command == "designspace":
-            designspace = designspaceLib.DesignSpaceDocument.fromfile(path)
-            process_designspace(designspace, options)
+        return serve(options.socket, options.max_fonts, options.max_memory)
+    if options.command == "designspace":
+        options = parse_designspace_args(options, parser)
+
+    if options.profile:
+        instrument.start()
+    if options.cprofile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run_command(options, parser)
+    finally:
+        if options.cprofile:
+            profiler.disable()
+            profiler.dump_stats(options.cprofile)
+        if options.profile:
+            report = {"command": options.command, **instrument.stop()}
+            instrument.write_report(report, options.profile)
 
-        font.save(path, overwrite=True)
+
+def run_command(options, parser):
+    if options.command == "designspace":
+        return process_designspace(options, parser)
+    if options.command == "run":
+        options.operations = load_recipe(options.recipe, parser)
+
+    if not check_renames(options.paths, options):
+        return 1
+
+    parts = None
+    if getattr(options, "lazy", False):
+        parts = touched_parts(options)
+
+    jobs = getattr(options, "jobs", 1) or os.cpu_count()
+    if jobs > 1 and len(options.paths) > 1:
+        return process_paths(options.paths, options, parts, jobs)
+
+    for path in options.paths:
+        process_path(path, options, parts)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+
+
+def cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "ufotweak")
+
+
+def cache_path(prefix, path):
+    # Cache file of path, keyed by its absolute path
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir(), f"{prefix}-{key}.json")
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_cache(path, version):
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get("version") != version:
+        return None
+    return cache
+
+
+def write_cache(path, cache):
+    # Written atomically, a cache that can't be written is ignored
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(cache, fp, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
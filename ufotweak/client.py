@@ -0,0 +1,47 @@
+import json
+import os
+import socket
+import sys
+
+from ufotweak.cache import cache_dir
+
+# Thin client of ufotweak serve, it only imports the standard library so that
+# it starts fast. Without a running server the command is run in process.
+
+
+def default_socket_path():
+    return os.environ.get("UFOTWEAK_SOCKET") or os.path.join(
+        cache_dir(), "serve.sock"
+    )
+
+
+def send(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        data = b""
+        while True:
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+
+def main(args=None):
+    if not args:
+        args = sys.argv[1:]
+    try:
+        response = send(default_socket_path(), {"args": args, "cwd": os.getcwd()})
+    except (FileNotFoundError, ConnectionRefusedError):
+        from ufotweak.__main__ import main as ufotweak_main
+
+        return ufotweak_main(args)
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+from collections import defaultdict
+
+from ufotweak.references import glyph_components, layer_components
+
+
+class ComponentGraph:
+    # Component dependencies of a layer, both ways: glyph -> base glyphs of its
+    # components and base glyph -> glyphs using it as a component. Transitive
+    # closures are memoised, cycles are walked once.
+    def __init__(self, components):
+        self.base_glyphs = {
+            name: set(base_glyphs) for name, base_glyphs in components.items()
+        }
+        self.users = defaultdict(set)
+        for name, base_glyphs in self.base_glyphs.items():
+            for base_glyph in base_glyphs:
+                self.users[base_glyph].add(name)
+        self._components_closures = dict()
+        self._dependents_closures = dict()
+
+    @classmethod
+    def from_layer(cls, layer):
+        return cls(layer_components(layer))
+
+    @classmethod
+    def from_font(cls, font, layer_name=None):
+        if layer_name is None:
+            layer = font.layers.defaultLayer
+        else:
+            layer = font.layers[layer_name]
+        return cls.from_layer(layer)
+
+    @classmethod
+    def from_glyph_names(cls, font, names, layer_name=None):
+        # Graph of names and the glyphs they are built from only, the other
+        # glyphs of the layer aren't read
+        if layer_name is None:
+            layer = font.layers.defaultLayer
+        else:
+            layer = font.layers[layer_name]
+        components = dict()
+        stack = [name for name in names if name in layer]
+        while stack:
+            name = stack.pop()
+            if name in components:
+                continue
+            components[name] = glyph_components(layer, name)
+            stack.extend(
+                base_glyph for base_glyph in components[name] if base_glyph in layer
+            )
+        return cls(components)
+
+    @classmethod
+    def from_index(cls, glyph_index, layer_name=None):
+        # Graph of a whole layer from the component entries of a GlyphIndex
+        return cls(
+            {
+                name: entry["components"]
+                for name, entry in glyph_index.entries(layer_name).items()
+            }
+        )
+
+    def __contains__(self, name):
+        return name in self.base_glyphs
+
+    def _closure(self, name, edges, closures):
+        if name in closures:
+            return closures[name]
+        closure = set()
+        stack = [name]
+        while stack:
+            for next_name in edges.get(stack.pop(), ()):
+                if next_name in closure:
+                    continue
+                closure.add(next_name)
+                if next_name in closures:
+                    closure.update(closures[next_name])
+                else:
+                    stack.append(next_name)
+        closure.discard(name)
+        closures[name] = closure
+        return closure
+
+    def components_of(self, name):
+        # All glyphs name is built from, through nested components
+        return self._closure(name, self.base_glyphs, self._components_closures)
+
+    def dependents_of(self, name):
+        # All glyphs using name, through nested components
+        return self._closure(name, self.users, self._dependents_closures)
+
+    def components_closure(self, names):
+        closure = set(names)
+        for name in names:
+            closure.update(self.components_of(name))
+        return closure
+
+    def dependents_closure(self, names):
+        closure = set(names)
+        for name in names:
+            closure.update(self.dependents_of(name))
+        return closure
+
+    def topological_order(self, names):
+        # names with the base glyphs of their components before them, cycles
+        # are broken where they are found
+        names = list(names)
+        selected = set(names)
+        order = []
+        visited = set()
+        for start in names:
+            if start in visited:
+                continue
+            visited.add(start)
+            stack = [(start, iter(self.base_glyphs.get(start, ())))]
+            while stack:
+                name, base_glyphs = stack[-1]
+                for base_glyph in base_glyphs:
+                    if base_glyph in selected and base_glyph not in visited:
+                        visited.add(base_glyph)
+                        stack.append(
+                            (base_glyph, iter(self.base_glyphs.get(base_glyph, ())))
+                        )
+                        break
+                else:
+                    stack.pop()
+                    order.append(name)
+        return order
+
+
+def _closure_glyph_set(font, graph, names):
+    # Glyphs of names and the glyphs they are built from, other glyphs aren't
+    # loaded
+    return {
+        name: font[name] for name in graph.components_closure(names) if name in font
+    }
+
+
+def decompose_glyphs(font, names, graph=None):
+    # Decompose glyphs in topological order, so that nested components are
+    # already decomposed when the glyphs using them are
+    from ufo2ft.util import decomposeCompositeGlyph
+
+    names = [name for name in names if name in font]
+    if graph is None:
+        graph = ComponentGraph.from_glyph_names(font, names)
+    glyph_set = _closure_glyph_set(font, graph, names)
+    modified = set()
+    for name in graph.topological_order(names):
+        glyph = glyph_set[name]
+        if glyph.components:
+            decomposeCompositeGlyph(glyph, glyph_set)
+            modified.add(name)
+    return modified
+
+
+def decompose_components(layer, names, base_glyphs):
+    # Decompose the components of base_glyphs in the glyphs names, their other
+    # components are kept
+    from ufo2ft.util import decomposeCompositeGlyph
+
+    base_glyphs = set(base_glyphs)
+    for name in names:
+        decomposeCompositeGlyph(
+            layer[name], layer, include=base_glyphs, decomposeNested=False
+        )
+
+
+def propagate_anchors(font, names, graph=None):
+    # ufo2ft filter on the glyphs and the glyphs they are built from only
+    from ufo2ft.filters.propagateAnchors import PropagateAnchorsFilter
+
+    names = [name for name in names if name in font]
+    if graph is None:
+        graph = ComponentGraph.from_glyph_names(font, names)
+    glyph_set = _closure_glyph_set(font, graph, names)
+    return PropagateAnchorsFilter(include=names)(font, glyph_set)
@@ -0,0 +1,144 @@
+import os
+
+from fontTools.ufoLib import UFOReader
+from ufoLib2.objects import Glyph
+
+from ufotweak.index import GlyphIndex
+from ufotweak.parts import open_font
+
+# Glyph command options run by the engine, they only change each glyph on its
+# own. --decompose reads the base glyphs other workers may be rewriting and
+# stays in process.
+ENGINE_OPTIONS = frozenset(["drop_anchor", "drop_lib", "round"])
+
+
+def _glyph_coordinates(glyph):
+    return (
+        [(point.x, point.y) for contour in glyph.contours for point in contour],
+        [tuple(component.transformation) for component in glyph.components],
+        [(anchor.x, anchor.y) for anchor in glyph.anchors],
+    )
+
+
+def _drop_anchor(glyph, anchor_name):
+    anchors = [a for a in glyph.anchors if anchor_name in ("*", a.name)]
+    for anchor in anchors:
+        glyph.anchors.remove(anchor)
+    return bool(anchors)
+
+
+def _drop_lib(glyph, lib_key):
+    if lib_key == "*":
+        changed = bool(glyph.lib)
+        glyph.lib.clear()
+        return changed
+    if lib_key in glyph.lib:
+        del glyph.lib[lib_key]
+        return True
+    return False
+
+
+def process_glyph_chunk(ufo_path, layer_name, glyph_operations):
+    # Run in a worker process: read, tweak and write the .glif files of a
+    # chunk of glyphs, returns the names of the changed glyphs
+    from ufotweak.rounding import round_glyphs
+
+    reader = UFOReader(ufo_path, validate=False)
+    glyph_set = reader.getGlyphSet(layer_name, validateRead=False)
+    glyphs = dict()
+    changed = set()
+    rounded = dict()
+    for name, operations in glyph_operations:
+        glyph = Glyph(name)
+        glyph_set.readGlyph(name, glyph, glyph.getPointPen())
+        glyphs[name] = glyph
+        for operation, argument in operations:
+            if operation == "drop_anchor" and _drop_anchor(glyph, argument):
+                changed.add(name)
+            elif operation == "drop_lib" and _drop_lib(glyph, argument):
+                changed.add(name)
+            elif operation == "round":
+                rounded[name] = _glyph_coordinates(glyph)
+    round_glyphs([glyphs[name] for name in rounded])
+    for name, coordinates in rounded.items():
+        if _glyph_coordinates(glyphs[name]) != coordinates:
+            changed.add(name)
+    for name in sorted(changed):
+        glyph = glyphs[name]
+        glyph_set.writeGlyph(name, glyph, glyph.drawPoints)
+    reader.close()
+    return layer_name, sorted(changed)
+
+
+def glyph_operations(font, options):
+    # Operations of options by layer name and glyph name, in the order
+    # process_glyph runs them, only for the glyphs they can change
+    glyph_index = GlyphIndex(font)
+    default_layer_name = font.layers.defaultLayer.name
+    operations = dict()
+
+    def add(layer_name, names, operation):
+        layer_operations = operations.setdefault(layer_name, dict())
+        for name in names:
+            layer_operations.setdefault(name, []).append(operation)
+
+    if options.drop_anchor:
+        anchor_name, glyph_names = options.drop_anchor.split(":")
+        anchor_index = glyph_index.anchor_index(
+            None if anchor_name == "*" else [anchor_name]
+        )
+        names = set().union(*anchor_index.values())
+        if glyph_names != "*":
+            names.intersection_update(glyph_names.split(","))
+        add(default_layer_name, sorted(names), ("drop_anchor", anchor_name))
+    if options.drop_lib:
+        lib_key, glyph_names = options.drop_lib.split(":")
+        for layer in font.layers:
+            names = glyph_index.glyphs_with_lib_key(
+                None if lib_key == "*" else lib_key, layer.name
+            )
+            if glyph_names != "*":
+                names = [n for n in names if n in glyph_names.split(",")]
+            add(layer.name, names, ("drop_lib", lib_key))
+    if options.round:
+        glyph_names = options.round.split(",")
+        if "*" in glyph_names:
+            glyph_names = list(font.keys())
+        else:
+            glyph_names = [n for n in glyph_names if n in font]
+        add(default_layer_name, glyph_names, ("round", None))
+    return operations
+
+
+def process_glyph_files(path, options, jobs=None):
+    # Split the glyph files to tweak in chunks processed by worker processes,
+    # returns the changed glyph names by layer name
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count()
+    font = open_font(path, parts=())
+    try:
+        operations = glyph_operations(font, options)
+    finally:
+        font.close()
+
+    chunks = []
+    for layer_name, layer_operations in operations.items():
+        items = sorted(layer_operations.items())
+        chunk_size = max(1, -(-len(items) // (jobs * 4)))
+        for i in range(0, len(items), chunk_size):
+            chunks.append((layer_name, items[i : i + chunk_size]))
+
+    changed = dict()
+    if not chunks:
+        return changed
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(process_glyph_chunk, path, layer_name, items)
+            for layer_name, items in chunks
+        ]
+        for future in futures:
+            layer_name, names = future.result()
+            if names:
+                changed.setdefault(layer_name, []).extend(names)
+    return changed
@@ -0,0 +1,544 @@
+import re
+from io import StringIO
+
+from fontTools.feaLib.error import FeatureLibError
+from fontTools.feaLib.lexer import Lexer
+from fontTools.feaLib.parser import Parser
+
+# Statements where names outside of glyph classes are not glyph names
+NON_GLYPH_STATEMENTS = {
+    "anchorDef",
+    "conditionset",
+    "cvParameters",
+    "DesignAxis",
+    "ElidedFallbackName",
+    "ElidedFallbackNameID",
+    "feature",
+    "featureNames",
+    "FontRevision",
+    "include",
+    "language",
+    "languagesystem",
+    "lookup",
+    "lookupflag",
+    "name",
+    "nameid",
+    "parameters",
+    "script",
+    "sizemenuname",
+    "table",
+    "valueRecordDef",
+    "variation",
+    "Vendor",
+}
+
+# Names following these are tags or lookup and anchor names
+NON_GLYPH_PREFIXES = {"anchor", "feature", "language", "lookup", "script"}
+
+KEYWORDS = {
+    "base",
+    "by",
+    "contourpoint",
+    "cursive",
+    "device",
+    "enum",
+    "exclude_dflt",
+    "from",
+    "ignore",
+    "include_dflt",
+    "ligComponent",
+    "ligature",
+    "mark",
+    "NULL",
+    "required",
+    "useExtension",
+}
+
+NAME_RE = re.compile(r"[A-Za-z0-9_.+*:^~!/\\-]+")
+# A glyph range may hold glyph names that don't occur in the text
+RANGE_RE = re.compile(r"[A-Za-z0-9_.]\s*-\s*[A-Za-z_.]")
+
+
+def _names_in_text(text):
+    # All the names that may be glyph or class names in text, as a quick
+    # check before lexing or parsing it
+    names = set()
+    for token in NAME_RE.findall(text):
+        token = token.lstrip("\\")
+        names.add(token)
+        if "-" in token:
+            names.update(token.split("-"))
+    return names
+
+
+def rename_glyphs_in_features(text, mapping, class_mapping=None):
+    # Rename glyph name and glyph class tokens in place, leaving the rest of the
+    # text untouched. Returns None when the text can't be renamed without
+    # parsing it, for glyph ranges with renamed glyphs or anonymous blocks.
+    class_mapping = class_mapping or {}
+    names = _names_in_text(text)
+    if names.isdisjoint(mapping) and names.isdisjoint(class_mapping):
+        return text
+
+    lexer = Lexer(text, "<features>")
+    tokens = []
+    try:
+        while True:
+            token_type, token, _ = lexer.next_()
+            if token_type not in (Lexer.NEWLINE, Lexer.COMMENT):
+                tokens.append((token_type, token, lexer.pos_))
+    except StopIteration:
+        pass
+    except FeatureLibError:
+        return None
+
+    edits = []
+    keyword = None
+    brackets = angles = depth = 0
+    # Depth of the table block being skipped, names in tables other than GDEF
+    # aren't glyph names
+    table_depth = None
+    previous = (None, None)
+    for i, (token_type, token, end) in enumerate(tokens):
+        if token_type == Lexer.SYMBOL and token == "{":
+            if keyword == "table" and previous[1] != "GDEF" and table_depth is None:
+                table_depth = depth
+            depth += 1
+        elif token_type == Lexer.SYMBOL and token == "}":
+            depth -= 1
+            if depth == table_depth:
+                table_depth = None
+        if table_depth is not None:
+            previous = (token_type, token)
+            continue
+        if token_type == Lexer.SYMBOL:
+            if token in ";{}":
+                keyword = None
+            elif token == "[":
+                brackets += 1
+            elif token == "]":
+                brackets -= 1
+            elif token == "<":
+                angles += 1
+            elif token == ">":
+                angles -= 1
+        elif token_type == Lexer.GLYPHCLASS:
+            if token in class_mapping:
+                edits.append((end - len(token), end, class_mapping[token]))
+        elif token_type == Lexer.NAME:
+            if previous[0] is None or previous == (Lexer.SYMBOL, ";") or (
+                previous == (Lexer.SYMBOL, "{")
+            ):
+                # First token of a statement
+                keyword = token
+                if token in ("anon", "anonymous"):
+                    return None
+            elif (
+                previous == (Lexer.SYMBOL, "}")
+                or (previous[0] == Lexer.NAME and previous[1] in NON_GLYPH_PREFIXES)
+                or angles
+                or (keyword in NON_GLYPH_STATEMENTS and not brackets)
+                or token in KEYWORDS
+            ):
+                pass
+            elif token.lstrip("\\") in mapping:
+                name = token.lstrip("\\")
+                following = tokens[i + 1][:2] if i + 1 < len(tokens) else None
+                if previous == (Lexer.SYMBOL, "-") or following == (
+                    Lexer.SYMBOL,
+                    "-",
+                ):
+                    return None
+                edits.append((end - len(name), end, mapping[name]))
+            elif "-" in token and any(n in mapping for n in token.split("-")):
+                return None
+        previous = (token_type, token)
+
+    parts = []
+    position = 0
+    for start, end, new in edits:
+        parts.append(text[position:start])
+        parts.append(new)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+# Statements that don't hold rules, a feature block left with only these is
+# dropped
+NON_RULE_STATEMENTS = {"language", "lookupflag", "script", "subtable"}
+
+SUBSTITUTION_STATEMENTS = {"sub", "substitute", "rsub", "reversesub"}
+
+
+class _Statement:
+    # Tokens start to end, the ";", of a statement
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class _Block(_Statement):
+    # Tokens start to end, the ";" after "}", of a block with its statements
+    def __init__(self, start, end, statements):
+        super().__init__(start, end)
+        self.statements = statements
+
+
+def _tokens(text):
+    # Tokens with their start and end in text, without newlines and comments.
+    # Anonymous blocks are a single token. Returns None if text can't be lexed.
+    lexer = Lexer(text, "<features>")
+    tokens = []
+    try:
+        while True:
+            position = lexer.pos_
+            token_type, token, _ = lexer.next_()
+            if token_type in (Lexer.NEWLINE, Lexer.COMMENT):
+                continue
+            start = position
+            while text[start] in Lexer.CHAR_WHITESPACE_:
+                start += 1
+            tokens.append((token_type, token, start, lexer.pos_))
+            if (
+                token == "{"
+                and len(tokens) > 2
+                and tokens[-3][:2] in ((Lexer.NAME, "anon"), (Lexer.NAME, "anonymous"))
+            ):
+                position = lexer.pos_
+                token_type, token, _ = lexer.scan_anonymous_block(tokens[-2][1])
+                tokens.append((token_type, token, position, lexer.pos_))
+    except StopIteration:
+        pass
+    except FeatureLibError:
+        return None
+    return tokens
+
+
+def _statements(tokens, i=0):
+    # Statements and blocks from token i up to the closing "}" of the block
+    statements = []
+    start = i
+    while i < len(tokens):
+        token_type, token = tokens[i][:2]
+        if token_type != Lexer.SYMBOL:
+            i += 1
+        elif token == ";":
+            if i > start:
+                statements.append(_Statement(start, i))
+            i += 1
+            start = i
+        elif token == "{":
+            block_statements, i = _statements(tokens, i + 1)
+            while i < len(tokens) and tokens[i][:2] != (Lexer.SYMBOL, ";"):
+                i += 1
+            statements.append(_Block(start, i, block_statements))
+            i += 1
+            start = i
+        elif token == "}":
+            return statements, i
+        else:
+            i += 1
+    return statements, i
+
+
+def _removal_span(text, start, end):
+    # Span to remove for text[start:end] with the whitespace around it, the
+    # whole line when nothing else is left on it
+    before = start
+    while before > 0 and text[before - 1] in " \t":
+        before -= 1
+    after = end
+    while after < len(text) and text[after] in " \t":
+        after += 1
+    line_start = before == 0 or text[before - 1] == "\n"
+    if line_start and (after == len(text) or text[after] in "\r\n"):
+        if text.startswith("\r\n", after):
+            return before, after + 2
+        return before, min(after + 1, len(text))
+    if line_start or text[before - 1] == "[":
+        return start, after
+    return before, end
+
+
+class _FeatureDropper:
+    # Removes glyph names from the glyph classes of a feature file and the
+    # statements left referencing them or an empty class, as edits of the text
+    def __init__(self, text, tokens, glyph_names, font_glyph_names):
+        self.text = text
+        self.tokens = tokens
+        self.glyph_names = glyph_names
+        self.font_glyph_names = font_glyph_names
+        # Glyphs of the classes defined so far, None when they are unknown
+        self.classes = dict()
+        self._range_parser = None
+
+    def glyph_range(self, name, limit=None):
+        # Glyphs of a range, None when it isn't a valid range
+        if self._range_parser is None:
+            self._range_parser = Parser(
+                StringIO(""), glyphNames=self.font_glyph_names, followIncludes=False
+            )
+        try:
+            if limit is None:
+                name, limit = self._range_parser.split_glyph_range_(name, None)
+            return self._range_parser.make_glyph_range_(None, name, limit)
+        except FeatureLibError:
+            return None
+
+    def span(self, first, last):
+        return self.tokens[first][2], self.tokens[last][3]
+
+    def remove(self, first, last):
+        start, end = _removal_span(self.text, *self.span(first, last))
+        return [(start, end, "")]
+
+    def elements(self, statement):
+        # Glyph elements of statement: ("glyph", name, first, last), ("class",
+        # name, first, last) and ("bracket", members, first, last) with the
+        # members of the bracket as glyphs, classes and ranges. Also returns
+        # the indices of the elements marked with "'" and the "by" index.
+        tokens = self.tokens
+        keyword = tokens[statement.start][1]
+        elements = []
+        marked = []
+        by = None
+        members = None
+        angles = 0
+        i = statement.start + 1
+        if keyword in ("ignore", "enum", "enumerate"):
+            keyword = tokens[i][1]
+            i += 1
+        while i < statement.end:
+            token_type, token = tokens[i][:2]
+            previous = tokens[i - 1][:2]
+            if token_type == Lexer.SYMBOL:
+                if token == "[":
+                    members = []
+                    first = i
+                elif token == "]" and members is not None:
+                    elements.append(("bracket", members, first, i))
+                    members = None
+                elif token == "<":
+                    angles += 1
+                elif token == ">":
+                    angles -= 1
+                elif token == "'" and elements:
+                    marked.append(len(elements) - 1)
+            elif angles:
+                pass
+            elif token_type == Lexer.GLYPHCLASS:
+                element = ("class", token, i, i)
+                (elements if members is None else members).append(element)
+            elif token_type == Lexer.CID:
+                element = ("glyph", "\\%d" % token, i, i)
+                (elements if members is None else members).append(element)
+            elif token_type != Lexer.NAME:
+                pass
+            elif token in ("by", "from") and members is None:
+                by = len(elements)
+            elif (
+                (previous[0] == Lexer.NAME and previous[1] in NON_GLYPH_PREFIXES)
+                or token in KEYWORDS
+                or (keyword in NON_GLYPH_STATEMENTS and members is None)
+            ):
+                pass
+            elif members is not None:
+                name = token.lstrip("\\")
+                if tokens[i + 1][:2] == (Lexer.SYMBOL, "-"):
+                    members.append(("range", (name, tokens[i + 2][1]), i, i + 2))
+                    i += 2
+                elif "-" in name and name not in self.font_glyph_names:
+                    members.append(("range", (name, None), i, i))
+                else:
+                    members.append(("glyph", name, i, i))
+            else:
+                elements.append(("glyph", token.lstrip("\\"), i, i))
+            i += 1
+        return keyword, elements, marked, by
+
+    def glyphs(self, element):
+        # Glyphs of an element or a bracket member, None when they are unknown
+        kind, value = element[:2]
+        if kind == "glyph":
+            return [value]
+        if kind == "class":
+            return self.classes.get(value)
+        if kind == "range":
+            start, limit = value
+            return self.glyph_range(start.lstrip("\\"), limit and limit.lstrip("\\"))
+        glyphs = []
+        for member in value:
+            member_glyphs = self.glyphs(member)
+            if member_glyphs is None:
+                return None
+            glyphs.extend(member_glyphs)
+        return glyphs
+
+    def is_empty(self, element):
+        glyphs = self.glyphs(element)
+        if glyphs is None:
+            return False
+        return all(glyph in self.glyph_names for glyph in glyphs)
+
+    def bracket_edits(self, element):
+        # Edits removing the dropped glyphs of a bracket
+        edits = []
+        for member in element[1]:
+            kind, value, first, last = member
+            if kind == "glyph" and value in self.glyph_names:
+                edits.extend(self.remove(first, last))
+            elif kind == "range":
+                glyphs = self.glyphs(member)
+                if glyphs is None or self.glyph_names.isdisjoint(glyphs):
+                    continue
+                kept = [glyph for glyph in glyphs if glyph not in self.glyph_names]
+                if kept:
+                    edits.append((*self.span(first, last), " ".join(kept)))
+                else:
+                    edits.extend(self.remove(first, last))
+        return edits
+
+    def single_substitution_edits(self, elements, marked, by):
+        # Edits keeping the glyph classes of a single substitution the same
+        # length, None when it isn't one with glyph classes on both sides
+        inputs = marked or range(by)
+        if len(inputs) != 1 or len(elements) != by + 1:
+            return None
+        source = elements[inputs[0]]
+        target = elements[by]
+        if source[0] == "glyph" or target[0] == "glyph":
+            return None
+        source_glyphs = self.glyphs(source)
+        target_glyphs = self.glyphs(target)
+        if source_glyphs is None or target_glyphs is None:
+            if any(
+                glyphs is not None and not self.glyph_names.isdisjoint(glyphs)
+                for glyphs in (source_glyphs, target_glyphs)
+            ):
+                return False
+            return []
+        if len(source_glyphs) != len(target_glyphs):
+            return None
+        kept = [
+            (source_glyph, target_glyph)
+            for source_glyph, target_glyph in zip(source_glyphs, target_glyphs)
+            if source_glyph not in self.glyph_names
+            and target_glyph not in self.glyph_names
+        ]
+        if not kept:
+            return False
+        if len(kept) == len(source_glyphs):
+            return []
+        edits = []
+        for element, glyphs in zip((source, target), zip(*kept)):
+            edits.append((*self.span(*element[2:]), "[%s]" % " ".join(glyphs)))
+        return edits
+
+    def statement_edits(self, statement):
+        # Edits of a statement, None when it should be removed
+        tokens = self.tokens
+        if tokens[statement.start][0] == Lexer.GLYPHCLASS:
+            # Class definitions are kept even when empty, they may be referenced
+            name = tokens[statement.start][1]
+            definition = _Statement(statement.start + 1, statement.end)
+            _, elements, _, _ = self.elements(definition)
+            if len(elements) != 1:
+                self.classes[name] = None
+                return []
+            self.classes[name] = self.glyphs(elements[0])
+            if elements[0][0] == "bracket":
+                return self.bracket_edits(elements[0])
+            return []
+
+        keyword, elements, marked, by = self.elements(statement)
+        if keyword == "markClass" and elements and elements[-1][0] == "class":
+            name = elements.pop()[1]
+            glyphs = self.glyphs(elements[0]) if len(elements) == 1 else None
+            if name not in self.classes or self.classes[name] is not None:
+                self.classes[name] = (
+                    None if glyphs is None else self.classes.get(name, []) + glyphs
+                )
+        # Empty glyph classes are allowed in GlyphClassDef
+        keep_empty = keyword == "GlyphClassDef"
+
+        edits = []
+        if keyword in SUBSTITUTION_STATEMENTS and by is not None:
+            substitution_edits = self.single_substitution_edits(elements, marked, by)
+            if substitution_edits is False:
+                return None
+            if substitution_edits is not None:
+                edits.extend(substitution_edits)
+                inputs = marked or range(by)
+                elements = [
+                    element
+                    for i, element in enumerate(elements)
+                    if i not in (inputs[0], by)
+                ]
+        for element in elements:
+            kind, value = element[:2]
+            if kind == "glyph" and value in self.glyph_names:
+                return None
+            if self.is_empty(element) and not keep_empty:
+                return None
+            if kind == "bracket":
+                edits.extend(self.bracket_edits(element))
+        return edits
+
+    def statements_edits(self, statements, skip=False):
+        # Edits of statements, whether any was removed and whether rules are left
+        edits = []
+        removed = False
+        rules = False
+        for statement in statements:
+            if isinstance(statement, _Block):
+                edits.extend(self.block_edits(statement, skip))
+                rules = True
+                continue
+            statement_edits = [] if skip else self.statement_edits(statement)
+            if statement_edits is None:
+                edits.extend(self.remove(statement.start, statement.end))
+                removed = True
+            else:
+                edits.extend(statement_edits)
+                if self.tokens[statement.start][1] not in NON_RULE_STATEMENTS:
+                    rules = True
+        return edits, removed, rules
+
+    def block_edits(self, block, skip=False):
+        # Edits of a block, a feature block left without rules is removed
+        keyword = self.tokens[block.start][1]
+        tag = self.tokens[block.start + 1][1]
+        # Names in tables other than GDEF are not glyph names
+        skip = skip or (keyword == "table" and tag != "GDEF")
+        edits, removed, rules = self.statements_edits(block.statements, skip)
+        if keyword == "feature" and removed and not rules:
+            return self.remove(block.start, block.end)
+        return edits
+
+
+def drop_glyphs_from_features(text, glyph_names, font_glyph_names):
+    # Remove glyph_names from glyph classes and remove the statements that
+    # would be left referencing them or an empty class, editing the text in
+    # place. Included files are left untouched.
+    glyph_names = set(glyph_names)
+    if _names_in_text(text).isdisjoint(glyph_names) and not RANGE_RE.search(text):
+        return text
+    tokens = _tokens(text)
+    if tokens is None:
+        return text
+
+    statements, _ = _statements(tokens)
+    dropper = _FeatureDropper(text, tokens, glyph_names, set(font_glyph_names))
+    edits, _, _ = dropper.statements_edits(statements)
+    parts = []
+    position = 0
+    for start, end, new in sorted(edits):
+        # Removals may overlap on the whitespace between them
+        if end <= position:
+            continue
+        parts.append(text[position : max(start, position)])
+        parts.append(new)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
@@ -0,0 +1,69 @@
+import os
+import xml.etree.ElementTree
+
+from ufotweak.cache import cache_path, file_hash, read_cache, write_cache
+
+CACHE_VERSION = 1
+
+
+def parse_glyphsdata_unicodes(path):
+    # Stream the GlyphData.xml glyph elements, clearing them once read
+    unicodes = dict()
+    for _, element in xml.etree.ElementTree.iterparse(path):
+        if element.tag != "glyph":
+            continue
+        uni = element.attrib.get("unicode")
+        if uni:
+            names = []
+            name = element.attrib.get("name")
+            alt_names = element.attrib.get("altNames")
+            prod_name = element.attrib.get("production")
+            if name:
+                names.append(name)
+            if alt_names:
+                names.extend(alt_names.split(", "))
+            if prod_name:
+                names.append(prod_name)
+            unicodes[int(uni, 16)] = names
+        element.clear()
+    return unicodes
+
+
+def glyphsdata_unicodes(path, use_cache=True):
+    # Unicode to names index of a GlyphData.xml file, cached on disk and
+    # validated by the file modification time, or by its hash when touched
+    if not use_cache:
+        return parse_glyphsdata_unicodes(path)
+
+    path = os.path.abspath(path)
+    glyphsdata_cache_path = cache_path("glyphsdata", path)
+    stat = os.stat(path)
+
+    cache = read_cache(glyphsdata_cache_path, CACHE_VERSION)
+    sha256 = None
+    if cache:
+        if cache["mtime"] == stat.st_mtime_ns and cache["size"] == stat.st_size:
+            return {int(k, 16): v for k, v in cache["unicodes"].items()}
+        sha256 = file_hash(path)
+        if cache["sha256"] == sha256:
+            unicodes = {int(k, 16): v for k, v in cache["unicodes"].items()}
+            _write_cache(glyphsdata_cache_path, path, stat, sha256, unicodes)
+            return unicodes
+
+    unicodes = parse_glyphsdata_unicodes(path)
+    if sha256 is None:
+        sha256 = file_hash(path)
+    _write_cache(glyphsdata_cache_path, path, stat, sha256, unicodes)
+    return unicodes
+
+
+def _write_cache(glyphsdata_cache_path, path, stat, sha256, unicodes):
+    cache = {
+        "version": CACHE_VERSION,
+        "path": path,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": sha256,
+        "unicodes": {f"{k:04X}": v for k, v in unicodes.items()},
+    }
+    write_cache(glyphsdata_cache_path, cache)
@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+
+class GroupIndex:
+    # Reverse glyph -> groups index of a font's groups, so glyph renames and
+    # removals only rebuild the groups actually containing the glyphs.
+    def __init__(self, groups):
+        self.groups = groups
+        self.glyph_groups = defaultdict(set)
+        for group_name, glyph_names in groups.items():
+            for glyph_name in glyph_names:
+                self.glyph_groups[glyph_name].add(group_name)
+
+    def groups_of(self, glyph_name):
+        return self.glyph_groups.get(glyph_name, set())
+
+    def _affected_groups(self, glyph_names):
+        affected = set()
+        for glyph_name in glyph_names:
+            affected.update(self.glyph_groups.get(glyph_name, ()))
+        return affected
+
+    def rename_glyphs(self, mapping):
+        affected = self._affected_groups(mapping)
+        for group_name in affected:
+            group = self.groups[group_name]
+            group[:] = [mapping.get(n, n) for n in group]
+        moved = {
+            old: self.glyph_groups.pop(old)
+            for old in mapping
+            if old in self.glyph_groups
+        }
+        for old, group_names in moved.items():
+            self.glyph_groups[mapping[old]].update(group_names)
+        return affected
+
+    def remove_glyphs(self, glyph_names):
+        glyph_names = set(glyph_names)
+        affected = self._affected_groups(glyph_names)
+        for group_name in affected:
+            group = self.groups[group_name]
+            group[:] = [n for n in group if n not in glyph_names]
+        for glyph_name in glyph_names:
+            self.glyph_groups.pop(glyph_name, None)
+        return affected
+
+    def rename_groups(self, mapping):
+        # Groups are taken out before being inserted with their new names, so
+        # that groups can swap names
+        groups = {new: self.groups.pop(old) for old, new in mapping.items()}
+        self.groups.update(groups)
+        for old, new in mapping.items():
+            for glyph_name in groups[new]:
+                group_names = self.glyph_groups[glyph_name]
+                group_names.discard(old)
+        for new, group in groups.items():
+            for glyph_name in group:
+                self.glyph_groups[glyph_name].add(new)
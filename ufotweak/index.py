@@ -0,0 +1,150 @@
+import hashlib
+
+from ufotweak.cache import cache_path, read_cache, write_cache
+from ufotweak.references import (
+    glif_anchors,
+    glif_components,
+    glif_lib_keys,
+    glif_unicodes,
+    glyph_set,
+    unloaded_glyph_names,
+)
+
+INDEX_VERSION = 3
+
+
+def glif_entry(data):
+    # Partial scan of the .glif data, only the lib element is parsed
+    return {
+        "unicodes": glif_unicodes(data),
+        "components": glif_components(data),
+        "anchors": glif_anchors(data),
+        "lib": sorted(glif_lib_keys(data)),
+    }
+
+
+def glyph_entry(glyph):
+    return {
+        "unicodes": list(glyph.unicodes),
+        "components": [component.baseGlyph for component in glyph.components],
+        "anchors": [anchor.name for anchor in glyph.anchors],
+        "lib": sorted(glyph.lib),
+    }
+
+
+class GlyphIndex:
+    # Unicodes, component base glyphs, anchor names and lib keys of the glyphs
+    # of a font, to find the glyphs a command needs without loading the others.
+    # Entries of the .glif files are cached on disk per UFO and validated by
+    # the .glif modification times, or by their hash when touched. Loaded
+    # glyphs are indexed from memory, as they may have been changed.
+    def __init__(self, font, use_cache=True):
+        self.font = font
+        self.path = font.path if use_cache else None
+        self._cache = None
+        self._glif_entries = dict()
+
+    def _read_cache(self):
+        if self._cache is None:
+            cache = None
+            if self.path is not None:
+                cache = read_cache(cache_path("index", self.path), INDEX_VERSION)
+            if cache is None:
+                cache = {"version": INDEX_VERSION, "path": None, "layers": {}}
+            self._cache = cache
+        return self._cache
+
+    def _layer_glif_entries(self, layer):
+        if layer.name in self._glif_entries:
+            return self._glif_entries[layer.name]
+        glyphs = glyph_set(layer)
+        if glyphs is None:
+            return dict()
+
+        cache = self._read_cache()
+        cached_entries = cache["layers"].get(layer.name, {})
+        entries = dict()
+        changed = len(cached_entries) != len(glyphs.contents)
+        for name in glyphs.keys():
+            entry = cached_entries.get(name)
+            mtime = glyphs.getGLIFModificationTime(name)
+            if entry is not None and mtime is not None and entry["mtime"] == mtime:
+                entries[name] = entry
+                continue
+            data = glyphs.getGLIF(name)
+            sha256 = hashlib.sha256(data).hexdigest()
+            if entry is None or entry["sha256"] != sha256:
+                entry = glif_entry(data)
+                entry["sha256"] = sha256
+            entry["mtime"] = mtime
+            entries[name] = entry
+            changed = True
+
+        self._glif_entries[layer.name] = entries
+        if changed and self.path is not None:
+            cache["path"] = self.path
+            cache["layers"][layer.name] = entries
+            write_cache(cache_path("index", self.path), cache)
+        return entries
+
+    def entries(self, layer_name=None):
+        # Entries of the glyphs currently in the layer
+        if layer_name is None:
+            layer = self.font.layers.defaultLayer
+        else:
+            layer = self.font.layers[layer_name]
+        glif_entries = self._layer_glif_entries(layer)
+        unloaded = set(unloaded_glyph_names(layer))
+        entries = dict()
+        for name in layer.keys():
+            if name in unloaded:
+                entries[name] = glif_entries[name]
+            else:
+                entries[name] = glyph_entry(layer[name])
+        return entries
+
+    def unicodes(self, layer_name=None):
+        return {
+            name: entry["unicodes"]
+            for name, entry in self.entries(layer_name).items()
+        }
+
+    def glyphs_with_components(self, base_glyphs, layer_name=None):
+        base_glyphs = set(base_glyphs)
+        return [
+            name
+            for name, entry in self.entries(layer_name).items()
+            if base_glyphs.intersection(entry["components"])
+        ]
+
+    def glyphs_with_anchors(self, anchor_names=None, layer_name=None):
+        # Glyphs with any of anchor_names, or with any anchor
+        if anchor_names is None:
+            return [
+                name
+                for name, entry in self.entries(layer_name).items()
+                if entry["anchors"]
+            ]
+        anchor_names = set(anchor_names)
+        return [
+            name
+            for name, entry in self.entries(layer_name).items()
+            if anchor_names.intersection(entry["anchors"])
+        ]
+
+    def anchor_index(self, anchor_names=None, layer_name=None):
+        # Anchor name to the glyphs with that anchor, for anchor_names or all
+        anchors = dict()
+        for name, entry in self.entries(layer_name).items():
+            for anchor_name in entry["anchors"]:
+                if anchor_names is None or anchor_name in anchor_names:
+                    anchors.setdefault(anchor_name, set()).add(name)
+        return anchors
+
+    def glyphs_with_lib_key(self, key=None, layer_name=None):
+        # Glyphs with key in their lib, or with any lib key
+        return [
+            name
+            for name, entry in self.entries(layer_name).items()
+            if (key in entry["lib"] if key is not None else entry["lib"])
+        ]
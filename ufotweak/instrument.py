@@ -0,0 +1,116 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from ufotweak.parts import ufo_stamp
+from ufotweak.references import loaded_glyph_count
+
+# Profile of the current run, steps are only recorded when --profile is given
+_profile = None
+
+
+def peak_rss():
+    # Peak resident set size of the process in bytes
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+class Profile:
+    # Wall and CPU time of nested steps, with the glyphs they loaded and the
+    # files they wrote
+    def __init__(self):
+        self.steps = []
+        self._stack = [self.steps]
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    @contextmanager
+    def step(self, name, font=None, ufo_path=None):
+        record = {"name": name}
+        if ufo_path is not None:
+            record["path"] = ufo_path
+        self._stack[-1].append(record)
+        record["steps"] = steps = []
+        self._stack.append(steps)
+        loaded = loaded_glyph_count(font) if font is not None else None
+        stamp = ufo_stamp(ufo_path)[0] if ufo_path is not None else None
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            self._stack.pop()
+            if font is not None:
+                record["glyphs_loaded"] = loaded_glyph_count(font) - loaded
+            if stamp is not None:
+                new_stamp = ufo_stamp(ufo_path)[0]
+                record["files_written"] = sum(
+                    1
+                    for name in stamp.keys() | new_stamp.keys()
+                    if stamp.get(name) != new_stamp.get(name)
+                )
+            if not steps:
+                del record["steps"]
+
+    def report(self):
+        return {
+            "wall": time.perf_counter() - self.wall,
+            "cpu": time.process_time() - self.cpu,
+            "peak_rss": peak_rss(),
+            "steps": self.steps,
+        }
+
+
+def start():
+    global _profile
+    _profile = Profile()
+
+
+def stop():
+    global _profile
+    report = _profile.report()
+    _profile = None
+    return report
+
+
+@contextmanager
+def step(name, font=None, ufo_path=None):
+    # Records a step of the current profile, glyphs loaded in font and files
+    # written in the UFO at ufo_path are counted
+    if _profile is None:
+        yield dict()
+        return
+    with _profile.step(name, font, ufo_path) as record:
+        yield record
+
+
+def add_report(name, report, path=None):
+    # Adds the profile report of a worker process as a step
+    if _profile is None or report is None:
+        return
+    record = {"name": name}
+    if path is not None:
+        record["path"] = path
+    record.update(report)
+    _profile.steps.append(record)
+
+
+def write_report(report, path):
+    if path == "-":
+        json.dump(report, sys.stderr, indent=2)
+        sys.stderr.write("\n")
+        return
+    with open(path, "w") as fp:
+        json.dump(report, fp, indent=2)
@@ -0,0 +1,117 @@
+from collections.abc import MutableMapping
+
+from ufotweak.parts import GLYPHS, GROUPS, KERNING, LIB
+
+_DELETED = object()
+_MISSING = object()
+
+
+class OverlayDict(MutableMapping):
+    # Copy-on-write view of a dict, changes are recorded without touching the
+    # base dict until committed. Values must be replaced, not mutated in place.
+    def __init__(self, base):
+        self.base = base
+        self.changes = dict()
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            value = self.changes[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.changes[key] = _DELETED
+
+    def __contains__(self, key):
+        if key in self.changes:
+            return self.changes[key] is not _DELETED
+        return key in self.base
+
+    def __iter__(self):
+        changes = self.changes
+        for key in self.base:
+            if changes.get(key) is not _DELETED:
+                yield key
+        for key, value in changes.items():
+            if key not in self.base and value is not _DELETED:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def diff(self):
+        # Changed keys with their new value, None for deleted keys
+        diff = dict()
+        for key, value in self.changes.items():
+            base_value = self.base.get(key, _MISSING)
+            if value is _DELETED:
+                if base_value is not _MISSING:
+                    diff[key] = None
+            elif value != base_value:
+                diff[key] = value
+        return diff
+
+    def commit(self):
+        diff = self.diff()
+        for key, value in diff.items():
+            if value is None:
+                del self.base[key]
+            else:
+                self.base[key] = value
+        self.changes.clear()
+        return bool(diff)
+
+
+class FontOverlay:
+    # Copy-on-write overlay of a font recording glyph, group, kerning and lib
+    # changes. It can be turned into a diff or committed to the font, which
+    # returns the font parts to save.
+    def __init__(self, font):
+        self.font = font
+        self.groups = OverlayDict(font.groups)
+        self.kerning = OverlayDict(font.kerning)
+        self.lib = OverlayDict(font.lib)
+        self.glyphs = dict()
+
+    def insert_glyph(self, layer_name, glyph, name):
+        self.glyphs.setdefault(layer_name, dict())[name] = glyph
+
+    def diff(self):
+        return {
+            "glyphs": {
+                layer_name: sorted(glyphs) for layer_name, glyphs in self.glyphs.items()
+            },
+            "groups": self.groups.diff(),
+            "kerning": [
+                [left, right, value]
+                for (left, right), value in self.kerning.diff().items()
+            ],
+            "lib": self.lib.diff(),
+        }
+
+    def commit(self):
+        parts = set()
+        layers = self.font.layers
+        for layer_name, glyphs in self.glyphs.items():
+            if layer_name in layers:
+                layer = layers[layer_name]
+            else:
+                layer = self.font.newLayer(layer_name)
+            for name, glyph in glyphs.items():
+                layer.insertGlyph(glyph, name)
+            parts.add(GLYPHS)
+        self.glyphs.clear()
+        if self.groups.commit():
+            parts.add(GROUPS)
+        if self.kerning.commit():
+            parts.add(KERNING)
+        if self.lib.commit():
+            parts.add(LIB)
+        return parts
@@ -0,0 +1,69 @@
+import os
+
+from fontTools.ufoLib import UFOReader, UFOWriter
+from ufoLib2 import Font
+
+# Parts of a UFO a command can touch. Fonts opened for a known set of parts are
+# loaded lazily and only those parts are written back.
+FONTINFO = "fontinfo"
+LIB = "lib"
+GROUPS = "groups"
+KERNING = "kerning"
+FEATURES = "features"
+GLYPHS = "glyphs"
+
+ALL_PARTS = frozenset([FONTINFO, LIB, GROUPS, KERNING, FEATURES, GLYPHS])
+
+
+def open_font(path, parts=None, validate=True):
+    if parts is None:
+        return Font.open(path, lazy=False, validate=validate)
+    return Font.open(path, lazy=True, validate=validate)
+
+
+def ufo_format_version(path):
+    with UFOReader(path, validate=False) as reader:
+        return reader.formatVersionTuple[0]
+
+
+def save_font(font, path, parts=None, validate=True):
+    if parts is None:
+        font.save(path, overwrite=True, validate=validate)
+        return
+    if not parts:
+        return
+    if ufo_format_version(path) < 3:
+        # A partial save would mix a UFO3 metainfo.plist with the UFO2 layout,
+        # the full save converts the font to UFO3
+        font.save(path, overwrite=True, validate=validate)
+        return
+
+    with UFOWriter(path, validate=validate) as writer:
+        if FONTINFO in parts:
+            writer.writeInfo(font.info)
+        if LIB in parts:
+            writer.writeLib(font.lib)
+        if GROUPS in parts:
+            writer.writeGroups(font.groups)
+        if KERNING in parts:
+            writer.writeKerning(font.kerning)
+        if FEATURES in parts:
+            writer.writeFeatures(font.features.text)
+        if GLYPHS in parts:
+            # In place, only loaded glyphs are written and deleted glyphs removed
+            font.layers.write(writer, saveAs=False)
+        writer.setModificationTime()
+
+
+def ufo_stamp(path):
+    # Modification time and size of every file of a UFO, and their total size
+    stamp = dict()
+    total_size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            relative_path = os.path.relpath(file_path, path)
+            stamp[relative_path] = (stat.st_mtime_ns, stat.st_size)
+            total_size += stat.st_size
+    return stamp, total_size
@@ -0,0 +1,150 @@
+import re
+from xml.sax.saxutils import unescape
+
+from fontTools.misc import etree
+from fontTools.ufoLib.glifLib import readGlyphFromString
+from ufoLib2.objects.layer import _GLYPH_NOT_LOADED
+
+COMPONENT_INFO_KEY = "com.schriftgestaltung.Glyphs.ComponentInfo"
+METRICS_KEYS = [
+    f"com.schriftgestaltung.Glyphs.glyph.{m}MetricsKey"
+    for m in ["left", "right", "width"]
+]
+
+# Component base glyphs and glyph lib strings, which include the Glyphs
+# ComponentInfo names and metrics keys
+GLIF_REFERENCE_RE = re.compile(rb'base="([^"]*)"|<string>(?:\|?=)?([^<]*)</string>')
+GLIF_COMPONENT_RE = re.compile(rb'<component\s[^>]*?base="([^"]*)"')
+GLIF_ANCHOR_RE = re.compile(rb'<anchor\s[^>]*?name="([^"]*)"')
+GLIF_UNICODE_RE = re.compile(rb'<unicode\s[^>]*?hex="([^"]*)"')
+# GLIF format 1 anchors are single point contours with a name
+GLIF_FORMAT_1_RE = re.compile(rb'<glyph\s[^>]*?format="1"')
+
+
+def split_metrics_key(value):
+    if value.startswith("="):
+        return "=", value[1:]
+    elif value.startswith("|="):
+        return "|=", value[2:]
+    return "", value
+
+
+def glyph_references(glyph):
+    names = set(component.baseGlyph for component in glyph.components)
+    for component_info in glyph.lib.get(COMPONENT_INFO_KEY) or ():
+        if component_info.get("name"):
+            names.add(component_info["name"])
+    for metrics_key in METRICS_KEYS:
+        value = glyph.lib.get(metrics_key)
+        if value:
+            names.add(split_metrics_key(value)[1])
+    return names
+
+
+def glif_references(data):
+    # Superset of glyph_references from the .glif data, without parsing it
+    names = set()
+    for base, string in GLIF_REFERENCE_RE.findall(data):
+        name = (base or string).decode("utf-8")
+        if "&" in name:
+            name = unescape(name, {"&quot;": '"', "&apos;": "'"})
+        names.add(name)
+    return names
+
+
+def _glif_names(regex, data):
+    names = []
+    for value in regex.findall(data):
+        name = value.decode("utf-8")
+        if "&" in name:
+            name = unescape(name, {"&quot;": '"', "&apos;": "'"})
+        names.append(name)
+    return names
+
+
+def glif_components(data):
+    return _glif_names(GLIF_COMPONENT_RE, data)
+
+
+class _GlifAnchors:
+    anchors = ()
+
+
+def glif_anchors(data):
+    if GLIF_FORMAT_1_RE.search(data):
+        glyph = _GlifAnchors()
+        readGlyphFromString(data, glyph)
+        return [anchor["name"] for anchor in glyph.anchors]
+    return _glif_names(GLIF_ANCHOR_RE, data)
+
+
+def glif_unicodes(data):
+    unicodes = []
+    for value in GLIF_UNICODE_RE.findall(data):
+        uni = int(value, 16)
+        if uni not in unicodes:
+            unicodes.append(uni)
+    return unicodes
+
+
+def glif_lib_keys(data):
+    # Only the lib element is parsed
+    start = data.find(b"<lib>")
+    if start == -1:
+        return []
+    end = data.rfind(b"</lib>")
+    lib = etree.fromstring(data[start : end + len(b"</lib>")])
+    if not len(lib):
+        return []
+    return [element.text for element in lib[0] if element.tag == "key"]
+
+
+def glyph_components(layer, name):
+    # Component base glyphs of a glyph of layer, without loading it if it isn't
+    # loaded yet
+    if layer._glyphs[name] is _GLYPH_NOT_LOADED:
+        return glif_components(read_glif(layer, name))
+    return [component.baseGlyph for component in layer[name].components]
+
+
+def layer_components(layer):
+    # Component base glyphs of every glyph in layer, without loading glyphs
+    # that aren't loaded yet
+    return {name: glyph_components(layer, name) for name in layer.keys()}
+
+
+def unloaded_glyph_names(layer):
+    return [
+        name for name, glyph in layer._glyphs.items() if glyph is _GLYPH_NOT_LOADED
+    ]
+
+
+def glyph_set(layer):
+    # GlyphSet a lazy layer was read from, None for other layers
+    return layer._glyphSet
+
+
+def loaded_glyph_count(font):
+    return sum(
+        len(layer) - len(unloaded_glyph_names(layer)) for layer in font.layers
+    )
+
+
+def read_glif(layer, name):
+    return layer._glyphSet.getGLIF(name)
+
+
+def layer_references(layer, names):
+    # Reverse index of the glyphs in layer referencing any of names. Glyphs not
+    # loaded yet are scanned from their .glif data and stay unloaded.
+    names = set(names)
+    users = {}
+    unloaded = set(unloaded_glyph_names(layer))
+    for glyph_name in layer.keys():
+        if glyph_name in unloaded:
+            references = glif_references(read_glif(layer, glyph_name))
+        else:
+            references = glyph_references(layer[glyph_name])
+        for name in references.intersection(names):
+            users.setdefault(name, set()).add(glyph_name)
+    return users
@@ -0,0 +1,63 @@
+from fontTools.misc.roundTools import otRound
+from fontTools.misc.transform import Transform
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _round_points(coordinates):
+    # Same rounding as otRound, on a flat list of coordinates
+    if numpy is not None:
+        return numpy.floor(numpy.array(coordinates) + 0.5).astype(int).tolist()
+    return [otRound(v) for v in coordinates]
+
+
+def _round_anchors(coordinates):
+    # Same rounding as round()
+    if numpy is not None:
+        return numpy.rint(numpy.array(coordinates)).astype(int).tolist()
+    return [round(v) for v in coordinates]
+
+
+def round_glyphs(glyphs):
+    # Round point coordinates, component offsets and anchors of glyphs in
+    # place, like drawing them through a RoundingPen, without recreating their
+    # contours. Coordinates of all glyphs are rounded as one array.
+    points = []
+    components = []
+    anchors = []
+    for glyph in glyphs:
+        for contour in glyph.contours:
+            points.extend(contour.points)
+        components.extend(glyph.components)
+        anchors.extend(glyph.anchors)
+
+    coordinates = []
+    for point in points:
+        coordinates.append(point.x)
+        coordinates.append(point.y)
+    for component in components:
+        coordinates.append(component.transformation[4])
+        coordinates.append(component.transformation[5])
+    if coordinates:
+        rounded = iter(_round_points(coordinates))
+        for point in points:
+            point.x = next(rounded)
+            point.y = next(rounded)
+        for component in components:
+            xx, xy, yx, yy, _, _ = component.transformation
+            component.transformation = Transform(
+                xx, xy, yx, yy, next(rounded), next(rounded)
+            )
+
+    coordinates = []
+    for anchor in anchors:
+        coordinates.append(anchor.x)
+        coordinates.append(anchor.y)
+    if coordinates:
+        rounded = iter(_round_anchors(coordinates))
+        for anchor in anchors:
+            anchor.x = next(rounded)
+            anchor.y = next(rounded)
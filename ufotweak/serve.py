@@ -0,0 +1,176 @@
+import json
+import os
+import socket
+import traceback
+from collections import OrderedDict
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+from ufotweak.__main__ import (
+    FONT_COMMANDS,
+    build_parser,
+    check_renames,
+    load_recipe,
+    parse_args,
+    process_font,
+    process_path,
+    touched_parts,
+)
+from ufotweak.client import default_socket_path
+from ufotweak.parts import open_font, save_font, ufo_stamp
+
+
+class FontCache:
+    # Lazily loaded fonts by path, least recently used first. A font is
+    # reopened when its files changed on disk since it was opened or saved.
+    # Fonts are evicted past max_fonts or when the size of their UFOs on disk,
+    # used as an estimate of their memory, exceeds max_bytes.
+    def __init__(self, max_fonts=16, max_bytes=1 << 30):
+        self.max_fonts = max_fonts
+        self.max_bytes = max_bytes
+        self.fonts = OrderedDict()
+
+    def __contains__(self, path):
+        return path in self.fonts
+
+    def open(self, path):
+        stamp, size = ufo_stamp(path)
+        if path in self.fonts:
+            font, font_stamp, _ = self.fonts[path]
+            if font_stamp == stamp:
+                self.fonts.move_to_end(path)
+                return font
+            self.evict(path)
+        font = open_font(path, parts=())
+        self.fonts[path] = (font, stamp, size)
+        self._evict_least_recently_used()
+        return font
+
+    def saved(self, path):
+        font, _, _ = self.fonts[path]
+        stamp, size = ufo_stamp(path)
+        self.fonts[path] = (font, stamp, size)
+        self._evict_least_recently_used()
+
+    def evict(self, path):
+        font, _, _ = self.fonts.pop(path)
+        font.close()
+
+    def clear(self):
+        for path in list(self.fonts):
+            self.evict(path)
+
+    def _evict_least_recently_used(self):
+        while len(self.fonts) > 1 and (
+            len(self.fonts) > self.max_fonts
+            or sum(size for _, _, size in self.fonts.values()) > self.max_bytes
+        ):
+            self.evict(next(iter(self.fonts)))
+
+
+class Server:
+    # Runs ufotweak commands sent by ufotweak.client, one at a time, against
+    # the fonts kept open in the cache. Only the changed parts are written.
+    def __init__(self, socket_path, cache):
+        self.socket_path = socket_path
+        self.cache = cache
+        self.parser = build_parser()
+
+    def process_path(self, path, options):
+        if not os.path.isdir(path):
+            process_path(path, options)
+            return
+        path = os.path.abspath(path)
+        font = self.cache.open(path)
+        try:
+            process_font(font, options)
+            save_font(font, path, touched_parts(options))
+        except BaseException:
+            # The font may be partly tweaked
+            self.cache.evict(path)
+            raise
+        self.cache.saved(path)
+
+    def run(self, args):
+        status = 0
+        options = parse_args(self.parser, args)
+        if options.command not in FONT_COMMANDS:
+            print(f"Unsupported command: {options.command}")
+            return 2
+        if options.command == "run":
+            options.operations = load_recipe(options.recipe, self.parser)
+        if not check_renames(options.paths, options):
+            return 1
+        for path in options.paths:
+            try:
+                self.process_path(path, options)
+            except Exception:
+                traceback.print_exc()
+                print(f"Failed: {path}")
+                status = 1
+        return status
+
+    def handle(self, data):
+        stdout = StringIO()
+        stderr = StringIO()
+        cwd = os.getcwd()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                request = json.loads(data)
+                os.chdir(request.get("cwd") or cwd)
+                status = self.run(request["args"])
+            except SystemExit as e:
+                # argparse errors and --help
+                status = e.code if isinstance(e.code, int) else 2
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os.chdir(cwd)
+        return {
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            "status": status,
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                try:
+                    client.connect(self.socket_path)
+                except OSError:
+                    os.remove(self.socket_path)
+                else:
+                    print(f"A server is already listening on {self.socket_path}")
+                    return 1
+        socket_dir = os.path.dirname(os.path.abspath(self.socket_path))
+        os.makedirs(socket_dir, exist_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.socket_path)
+            server.listen()
+            print(f"Listening on {self.socket_path}")
+            try:
+                while True:
+                    connection, _ = server.accept()
+                    with connection:
+                        data = b""
+                        while True:
+                            chunk = connection.recv(1 << 16)
+                            if not chunk:
+                                break
+                            data += chunk
+                        response = self.handle(data)
+                        connection.sendall(json.dumps(response).encode("utf-8"))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(self.socket_path)
+                self.cache.clear()
+        return 0
+
+
+def serve(socket_path=None, max_fonts=16, max_memory=1024):
+    if socket_path is None:
+        socket_path = default_socket_path()
+    cache = FontCache(max_fonts, max_memory * (1 << 20))
+    return Server(socket_path, cache).serve_forever()
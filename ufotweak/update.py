@@ -1,114 +1,182 @@
+import json
 from argparse import ArgumentParser
 from ufoLib2 import Font
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from ufotweak.components import ComponentGraph
+from ufotweak.overlay import FontOverlay
+from ufotweak.parts import save_font
 
 
 class Updater:
-    def __init__(self, source, target, glyphs, layers=None, overwrite_components=True):
+    def __init__(
+        self,
+        source,
+        target,
+        glyphs,
+        layers=None,
+        overwrite_components=True,
+        component_graph=None,
+    ):
         self.source = source
         self.target = target
         self.glyphs = glyphs
         self.layers = layers
-        self._font = None
+        self._overlay = None
+        self.parts = set()
         self._all_glyphs = set()
         self.overwrite_components = overwrite_components
+        self._component_graph = component_graph
 
     @property
-    def font(self):
-        if not self._font:
+    def component_graph(self):
+        # Built once per source font, can be shared between updaters
+        if self._component_graph is None:
+            self._component_graph = ComponentGraph.from_font(self.source)
+        return self._component_graph
+
+    @property
+    def overlay(self):
+        # Updates are recorded in a copy-on-write overlay of the target
+        if self._overlay is None:
+            self._overlay = FontOverlay(self.target)
             self._update_font()
-        return self._font
+        return self._overlay
+
+    @property
+    def font(self):
+        # The target font with the updates committed, the changed parts are
+        # collected in self.parts
+        self.parts.update(self.overlay.commit())
+        return self.target
+
+    def diff(self):
+        return self.overlay.diff()
 
     def _update_font(self):
-        # TODO clone target before changing it
-        self._font = self.target
         self._update_glyphs()
         self._update_groups()
         self._update_kerning()
 
     def _update_glyphs(self):
-        # TODO different layers
         self._collect_glyphs()
         all_glyphs = self._all_glyphs
-        glyphOrder = self._font.lib.get("public.glyphOrder")
+        glyphOrder = self._overlay.lib.get("public.glyphOrder")
 
-        for glyph in self.source:
-            name = glyph.name
-            if name in all_glyphs:
-                layer = self._font.layers.defaultLayer
-                if name in layer:
-                    del layer[name]
-                layer.insertGlyph(glyph, name)
-
-            if glyphOrder and name not in glyphOrder:
-                glyphOrder.append(name)
+        for source_layer in self._collect_layers():
+            # Source glyphs are loaded once and copied into each target
+            names = [name for name in source_layer.keys() if name in all_glyphs]
+            if not names:
+                continue
+            layer_name = self._target_layer_name(source_layer)
+            for name in names:
+                self._overlay.insert_glyph(layer_name, source_layer[name], name)
 
         if glyphOrder:
-            self._font.lib["public.glyphOrder"] = glyphOrder
+            names = set(glyphOrder)
+            added = [
+                name
+                for name in self.source.keys()
+                if name in all_glyphs and name not in names
+            ]
+            if added:
+                self._overlay.lib["public.glyphOrder"] = glyphOrder + added
+
+    def _collect_layers(self):
+        source_layers = self.source.layers
+        if not self.layers:
+            return [source_layers.defaultLayer]
+        layers = []
+        for layer_name in self.layers:
+            if layer_name not in source_layers:
+                print(f"{layer_name} not in source")
+                continue
+            layers.append(source_layers[layer_name])
+        return layers
 
+    def _target_layer_name(self, source_layer):
+        if source_layer is self.source.layers.defaultLayer:
+            return self.target.layers.defaultLayer.name
+        return source_layer.name
 
     def _collect_glyphs(self):
-        for glyph in self.source:
-            if glyph.name in self.glyphs:
-                self._collect_components(glyph)
+        graph = self.component_graph
+        glyphs = [name for name in self.glyphs if name in graph]
+        if self.overwrite_components:
+            self._all_glyphs.update(graph.components_closure(glyphs))
+            return
+        for name in glyphs:
+            self._collect_components(name)
 
-    def _collect_components(self, glyph):
+    def _collect_components(self, name):
+        # Components already in the target font are kept with their own
+        # components
+        graph = self.component_graph
         all_glyphs = self._all_glyphs
-        # print("> all_glyphs", all_glyphs)
-        for component in glyph.components:
-            name = component.baseGlyph
-            if name in all_glyphs:
-                continue
-            if name in self._font and not self.overwrite_components:
-                continue
-            all_glyphs.add(name)
-            self._collect_components(self.source[name])
-        all_glyphs.add(glyph.name)
+        all_glyphs.add(name)
+        stack = [name]
+        while stack:
+            for base_glyph in graph.base_glyphs.get(stack.pop(), ()):
+                if base_glyph in all_glyphs:
+                    continue
+                if base_glyph in self.target:
+                    continue
+                all_glyphs.add(base_glyph)
+                stack.append(base_glyph)
 
     def _collect_groups(self):
         # Collect dict keyed by source glyph with source groups they belong to as values
+        glyphs = set(self.glyphs)
         source_glyphs_groups = defaultdict(set)
         target_glyphs_groups = defaultdict(set)
         for group_name, glyphs_list in self.source.groups.items():
-            relevant_glyphs = set(glyphs_list).intersection(self.glyphs)
-            for glyph_name in relevant_glyphs:
+            for glyph_name in glyphs.intersection(glyphs_list):
                 source_glyphs_groups[glyph_name].add(group_name)
         self.source_glyphs_groups = source_glyphs_groups
-        for group_name, glyphs_list in self.target.groups.items():
-            relevant_glyphs = set(glyphs_list).intersection(self.glyphs)
-            for glyph_name in relevant_glyphs:
+        for group_name, glyphs_list in self._overlay.groups.items():
+            for glyph_name in glyphs.intersection(glyphs_list):
                 target_glyphs_groups[glyph_name].add(group_name)
         self.target_glyphs_groups = target_glyphs_groups
 
     def _update_groups(self):
         self._collect_groups()
-        # Add source groups not in target
-        for group_name, glyphs_list in self.source.groups.items():
-            if group_name not in self.target.groups and any(
-                n in glyphs_list for n in self.glyphs
-            ):
-                self.target.groups[group_name] = [
-                    n for n in glyphs_list if n in self.glyphs
-                ]
-
-        # Remove source glyphs from target groups that are not also source groups
-        for group_name, glyphs_list in list(self.target.groups.items()):
-            intersecting_glyphs = set(glyphs_list).intersection(self.glyphs)
-            for glyph_name in intersecting_glyphs:
-                if group_name not in self.source_glyphs_groups[glyph_name]:
-                    self.target.groups[group_name].remove(glyph_name)
-            if len(self.target.groups[group_name]) == 0:
-                del self.target.groups[group_name]
-
-        # Update groups that are in both
-        for group_name, glyphs_list in self.source.groups.items():
-            if group_name in self.target.groups:
-                for glyph_name in glyphs_list:
-                    if (
-                        glyph_name in self.glyphs
-                        and glyph_name not in self.target.groups[group_name]
-                    ):
-                        self.target.groups[group_name].append(glyph_name)
+        glyphs = set(self.glyphs)
+        source_groups = self.source.groups
+        target_groups = self._overlay.groups
+
+        affected = set()
+        for group_names in self.source_glyphs_groups.values():
+            affected.update(group_names)
+        for group_names in self.target_glyphs_groups.values():
+            affected.update(group_names)
+
+        # Each affected group is rebuilt once: target glyphs that are not
+        # updated or still in the source group are kept, then updated glyphs
+        # of the source group are added in source order
+        group_names = list(source_groups)
+        group_names.extend(n for n in target_groups if n not in source_groups)
+        for group_name in group_names:
+            if group_name not in affected:
+                continue
+            source_glyphs = [
+                n for n in source_groups.get(group_name, ()) if n in glyphs
+            ]
+            source_glyphs_set = set(source_glyphs)
+            glyphs_list = [
+                n
+                for n in target_groups.get(group_name, ())
+                if n not in glyphs or n in source_glyphs_set
+            ]
+            present = set(glyphs_list)
+            for glyph_name in source_glyphs:
+                if glyph_name not in present:
+                    present.add(glyph_name)
+                    glyphs_list.append(glyph_name)
+            if glyphs_list:
+                target_groups[group_name] = glyphs_list
+            elif group_name in target_groups:
+                del target_groups[group_name]
 
         # # Remove glyphs present in destination groups but not in source groups
         # for group_name, glyph_list in list(self.target.groups.items()):
@@ -142,35 +210,40 @@ class Updater:
         def is_group(name):
             return name.startswith("public.kern1.") or name.startswith("public.kern2.")
 
-        def is_updated(name, font, glyph_list=None):
-            if glyph_list is None:
-                glyph_list = self.glyphs
+        # Updated glyphs and the target kerning groups they are in
+        glyphs = set(self.glyphs)
+        updated = set(glyphs)
+        target_groups = self._overlay.groups
+        for group_name, glyphs_list in target_groups.items():
+            if is_group(group_name) and not glyphs.isdisjoint(glyphs_list):
+                updated.add(group_name)
 
-            if name in glyph_list:
-                return True
-            elif is_group(name) and set(font.groups.get(name, ())).intersection(
-                glyph_list
-            ):
-                return True
-            return False
-
-        # Remove kerning of updated glyphs
-        for kern_pair, value in list(self.target.kerning.items()):
-            left, right = kern_pair
-            if is_updated(left, self.target) or is_updated(right, self.target):
-                del self.target.kerning[kern_pair]
-        # Then copy kerning of updated glyphs
-        for kern_pair, value in self.source.kerning.items():
-            left, right = kern_pair
-            if is_updated(left, self.target) or is_updated(right, self.target):
-                self.target.kerning[kern_pair] = value
-        # Prune kerning of groups not present anymore
-        for kern_pair, value in list(self.target.kerning.items()):
-            left, right = kern_pair
-            if (is_group(left) and left not in self.target.groups) or (
-                is_group(right) and right not in self.target.groups
+        def is_missing(name):
+            return is_group(name) and name not in target_groups
+
+        target_kerning = self._overlay.kerning
+
+        # Keep kerning of glyphs not updated, then copy kerning of updated
+        # glyphs, pruning kerning of groups not present anymore
+        kerning = {
+            (left, right): value
+            for (left, right), value in target_kerning.items()
+            if left not in updated
+            and right not in updated
+            and not is_missing(left)
+            and not is_missing(right)
+        }
+        for (left, right), value in self.source.kerning.items():
+            if (left in updated or right in updated) and not (
+                is_missing(left) or is_missing(right)
             ):
-                del self.target.kerning[kern_pair]
+                kerning[(left, right)] = value
+        # Only changed pairs are recorded in the overlay
+        for pair in [pair for pair in target_kerning if pair not in kerning]:
+            del target_kerning[pair]
+        for pair, value in kerning.items():
+            if target_kerning.get(pair) != value:
+                target_kerning[pair] = value
 
         # # Prune kerning
         # for kern_pair, value in list(self.target.kerning.items()):
@@ -200,10 +273,26 @@ class Updater:
         #         self.target.kerning[(left, right)] = value
 
 
+def update_fonts(source, targets, glyphs, layers=None, overwrite_components=True):
+    # The source glyphs and their component graph are decoded once for all
+    # targets
+    component_graph = ComponentGraph.from_font(source)
+    updaters = []
+    for target in targets:
+        updater = Updater(
+            source, target, glyphs, layers, overwrite_components, component_graph
+        )
+        updater.overlay
+        updaters.append(updater)
+    return updaters
+
+
 def main(args=None):
     parser = ArgumentParser(description="Update UFO with data from another UFO.")
     parser.add_argument("source", metavar="SOURCE", help="Source UFO with data")
-    parser.add_argument("target", metavar="TARGET", help="Target UFO to update")
+    parser.add_argument(
+        "targets", metavar="TARGET", nargs="+", help="Target UFOs to update"
+    )
     # glyphs_group = parser.add_mutually_exclusive_group()
     parser.add_argument(
         "--glyphs",
@@ -225,10 +314,15 @@ def main(args=None):
         action="store_true",
         help="Overwrite component glyphs when used in glyphs to update.",
     )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the changes as JSON instead of saving them.",
+    )
     options = parser.parse_args(args)
 
     source = Font.open(options.source)
-    target = Font.open(options.target)
+    targets = [Font.open(path) for path in options.targets]
     if options.glyphs:
         glyphs = options.glyphs.split(",")
     elif options.glyphs_txt:
@@ -239,9 +333,20 @@ def main(args=None):
     layers = options.layers
     overwrite_components = options.overwrite_components
 
-    updater = Updater(source, target, glyphs, layers, overwrite_components)
+    updaters = update_fonts(source, targets, glyphs, layers, overwrite_components)
+    if options.dry_run:
+        for path, updater in zip(options.targets, updaters):
+            print(f"# {path}")
+            print(json.dumps(updater.diff(), indent=2))
+        return
+
+    # Only the changed glyphs and plists are written
+    def save(path, updater):
+        save_font(updater.font, path, updater.parts, validate=False)
+
     print("# Saving")
-    updater.font.save(validate=False)
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(save, options.targets, updaters))
 
 
 if __name__ == "__main__":